@@ -5,17 +5,26 @@ from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
 
+import calendar
+import errno
+import fcntl
 import hashlib
 import json
 import os
 import re
+import shutil
+import tempfile
+import threading
 import time
 import traceback
+import zipfile
 
 from contextlib import contextmanager
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from functools import wraps
+from io import BytesIO
+from multiprocessing.pool import ThreadPool
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils._text import to_bytes, to_native
@@ -65,6 +74,9 @@ ENTITY_KEYS = dict(
     users='login',
 )
 
+# Number of searches combined into one request by list_resource_by_searches
+SEARCH_BATCH_SIZE = 20
+
 
 def _exception2fail_json(msg='Generic failure: {0}'):
     def decor(f):
@@ -78,6 +90,14 @@ def _exception2fail_json(msg='Generic failure: {0}'):
     return decor
 
 
+class ForemanWorkerFailure(Exception):
+    """Raised instead of failing the module, when fail_json is called from a worker thread"""
+
+    def __init__(self, failure):
+        super(ForemanWorkerFailure, self).__init__(failure.get('msg'))
+        self.failure = failure
+
+
 class KatelloMixin():
     def __init__(self, **kwargs):
         foreman_spec = dict(
@@ -97,6 +117,90 @@ class KatelloMixin():
         self._patch_subscription_index_api()
         self._patch_sync_plan_api()
 
+    def find_repositories(self, repositories, params=None):
+        """Find many repositories by name and product name with few requests
+
+            Every product is resolved once and all repositories of a product are resolved with one search.
+
+            Parameters:
+                repositories (list): Dicts with the 'name' and the 'product' (name) of the repositories
+                params (dict): Scope of the search, usually the organization
+            Return value:
+                List of the found repositories, in the order of repositories
+        """
+        names_by_product = OrderedDict()
+        for repository in repositories:
+            names = names_by_product.setdefault(repository['product'], [])
+            if repository['name'] not in names:
+                names.append(repository['name'])
+
+        product_searches = ['name="{0}"'.format(product) for product in names_by_product]
+        products = {product['name']: product for product in self.list_resource_by_searches('products', product_searches, params)}
+
+        found = {}
+        for product_name, names in names_by_product.items():
+            if product_name not in products:
+                continue
+            searches = ['name="{0}"'.format(name) for name in names]
+            for result in self.list_resource_by_searches('repositories', searches, {'product_id': products[product_name]['id']}):
+                found[(result['name'], product_name)] = result
+        missing = [repository for repository in repositories if (repository['name'], repository['product']) not in found]
+        if missing:
+            self.fail_json(msg="Could not find repositories: {0}".format(
+                ', '.join('{0} ({1})'.format(repository['name'], repository['product']) for repository in missing)))
+        return [found[(repository['name'], repository['product'])] for repository in repositories]
+
+    def find_content_views(self, names, params=None):
+        """Find many content views by name with few requests
+
+            Parameters:
+                names (list): Names of the content views
+                params (dict): Scope of the search, usually the organization
+            Return value:
+                List of the found content views, in the order of names
+        """
+        searches = ['name="{0}"'.format(name) for name in names]
+        content_views = {content_view['name']: content_view for content_view in self.list_resource_by_searches('content_views', searches, params)}
+        missing = [name for name in names if name not in content_views]
+        if missing:
+            self.fail_json(msg="Could not find content views: {0}".format(', '.join(missing)))
+        return [content_views[name] for name in names]
+
+    def find_subscriptions(self, subscriptions, params=None, cache_ttl=None):
+        """Find many subscriptions by name or pool id with few requests
+
+            Parameters:
+                subscriptions (list): Dicts with either the 'name' or the 'pool_id' of the subscriptions
+                params (dict): Scope of the search, usually the organization
+                cache_ttl (int): If set, all subscriptions of the scope are listed once and cached on disk
+                    for this many seconds, so calls for different activation keys share one listing (optional)
+            Return value:
+                List of the found subscriptions, in the order of subscriptions
+        """
+        def search_field(subscription):
+            if subscription.get('pool_id') is not None:
+                return 'id', subscription['pool_id']
+            return 'name', subscription['name']
+
+        if cache_ttl is None:
+            searches = ['{0}="{1}"'.format(*search_field(subscription)) for subscription in subscriptions]
+            candidates = self.list_resource_by_searches('subscriptions', searches, params)
+        else:
+            candidates = self.cached('subscriptions', [params], cache_ttl, lambda: self.list_resource('subscriptions', params=params))
+
+        found = []
+        for subscription in subscriptions:
+            field, value = search_field(subscription)
+            if field == 'id':
+                matches = [candidate for candidate in candidates if candidate.get('cp_id', str(candidate['id'])) == value]
+            else:
+                matches = [candidate for candidate in candidates if candidate['name'] == value]
+            if len(matches) != 1:
+                self.fail_json(msg="Found {0} results while searching for subscriptions with {1}=\"{2}\"".format(
+                    "too many ({0})".format(len(matches)) if matches else "no", field, value))
+            found.append(matches[0])
+        return found
+
     def _patch_content_uploads_update_api(self):
         """This is a workaround for the broken content_uploads update apidoc in katello.
             see https://projects.theforeman.org/issues/27590
@@ -246,6 +350,9 @@ class HostMixin(NestedParametersMixin):
 class ForemanAnsibleModule(AnsibleModule):
 
     def __init__(self, **kwargs):
+        # Marks worker threads of concurrent_map, where failing has to be deferred to the main thread
+        self._worker_state = threading.local()
+
         # State recording for changed and diff reporting
         self._changed = False
         self._before = defaultdict(list)
@@ -298,6 +405,8 @@ class ForemanAnsibleModule(AnsibleModule):
 
     def set_changed(self):
         self._changed = True
+        # lets a worker of concurrent_map tell whether its own item changed anything
+        self._worker_state.changed = True
 
     def _patch_location_api(self):
         """This is a workaround for the broken taxonomies apidoc in foreman.
@@ -423,6 +532,61 @@ class ForemanAnsibleModule(AnsibleModule):
 
         return self._resource_call(resource, 'index', params)['results']
 
+    @_exception2fail_json(msg='Failed to list resource: {0}')
+    def list_resource_page(self, resource, page, per_page, search=None, params=None):
+        if params is None:
+            params = {}
+        else:
+            params = params.copy()
+
+        if search is not None:
+            params['search'] = search
+        params['page'] = page
+        params['per_page'] = per_page
+
+        params = self._resource_prepare_params(resource, 'index', params)
+
+        return self._resource_call(resource, 'index', params)
+
+    def iter_resource(self, resource, search=None, params=None, per_page=1000):
+        """Iterate over all entities of a resource, fetching only one page at a time from the server"""
+        page = 1
+        while True:
+            response = self.list_resource_page(resource, page, per_page, search, params)
+            results = response['results']
+            for result in results:
+                yield result
+            if len(results) < per_page or page * per_page >= response.get('subtotal', page * per_page + 1):
+                break
+            page += 1
+
+    def list_resource_by_searches(self, resource, searches, params=None):
+        """Return the entities matching any of the searches, combining many searches into one request
+
+            Each request combines up to SEARCH_BATCH_SIZE searches, which keeps the query string
+            within the request line limits of common web servers.
+
+            Parameters:
+                resource (string): Plural name of the api resource
+                searches (list): Search queries as accepted by scoped_search
+                params (dict): Additional parameters (e.g. the scope) of the index request
+            Return value:
+                List of all found entities, an entity matching several searches is only returned once
+        """
+        results = []
+        seen = set()
+        for start in range(0, len(searches), SEARCH_BATCH_SIZE):
+            batch = searches[start:start + SEARCH_BATCH_SIZE]
+            if len(batch) == 1:
+                search = batch[0]
+            else:
+                search = ' or '.join('({0})'.format(query) for query in batch)
+            for result in self.list_resource(resource, search, params):
+                if result['id'] not in seen:
+                    seen.add(result['id'])
+                    results.append(result)
+        return results
+
     def find_resource(self, resource, search, params=None, failsafe=False, thin=None):
         list_params = {}
         if params is not None:
@@ -754,16 +918,16 @@ class ForemanAnsibleModule(AnsibleModule):
         return None
 
     def resource_action(self, resource, action, params, options=None, data=None, files=None,
-                        ignore_check_mode=False, record_change=True, ignore_task_errors=False):
+                        ignore_check_mode=False, record_change=True, ignore_task_errors=False, headers=None, wait=True):
         resource_payload = self._resource_prepare_params(resource, action, params)
         if options is None:
             options = {}
         try:
             result = None
             if ignore_check_mode or not self.check_mode:
-                result = self._resource_call(resource, action, resource_payload, options=options, data=data, files=files)
+                result = self._resource_call(resource, action, resource_payload, headers=headers, options=options, data=data, files=files)
                 is_foreman_task = isinstance(result, dict) and 'action' in result and 'state' in result and 'started_at' in result
-                if is_foreman_task:
+                if is_foreman_task and wait:
                     result = self.wait_for_task(result, ignore_errors=ignore_task_errors)
         except Exception as e:
             msg = 'Error while performing {0} on {1}: {2}'.format(
@@ -779,7 +943,7 @@ class ForemanAnsibleModule(AnsibleModule):
         while task['state'] not in ['paused', 'stopped']:
             duration -= self.task_poll
             if duration <= 0:
-                self.fail_json(msg="Timout waiting for Task {0}".format(task['id']))
+                self.fail_json(msg="Timeout waiting for Task {0}".format(task['id']))
             time.sleep(self.task_poll)
 
             resource_payload = self._resource_prepare_params('foreman_tasks', 'show', {'id': task['id']})
@@ -788,6 +952,49 @@ class ForemanAnsibleModule(AnsibleModule):
             self.fail_json(msg='Task {0}({1}) did not succeed. Task information: {2}'.format(task['action'], task['id'], task['humanized']['errors']))
         return task
 
+    def run_tasks(self, actions, concurrency):
+        """Perform resource actions that start tasks, with at most concurrency tasks running at the same time
+
+            All running tasks are polled with one bulk search request. Every task gets task_timeout
+            seconds from the moment it was started. Failed tasks do not fail the module, the caller
+            has to look at their result.
+
+            Parameters:
+                actions (list): (resource, action, params) tuples of the actions to perform
+                concurrency (int): Maximum number of tasks running at the same time
+            Return value:
+                List of dicts with the finished 'task' and its 'duration' in seconds, in the order of actions
+        """
+        pending = list(enumerate(actions))
+        running = {}
+        finished = [None] * len(actions)
+        while pending or running:
+            while pending and len(running) < concurrency:
+                index, (resource, action, params) = pending.pop(0)
+                started = time.time()
+                task = self.resource_action(resource, action, params, wait=False)
+                if task is None or task['state'] in ['paused', 'stopped']:
+                    finished[index] = {'task': task, 'duration': int(time.time() - started)}
+                else:
+                    running[task['id']] = (index, started)
+            if not running:
+                continue
+
+            time.sleep(self.task_poll)
+            searches = [{'type': 'task', 'task_id': task_id, 'search_id': task_id} for task_id in running]
+            resource_payload = self._resource_prepare_params('foreman_tasks', 'bulk_search', {'searches': searches})
+            for search in self._resource_call('foreman_tasks', 'bulk_search', resource_payload):
+                for task in search['results']:
+                    index, started = running[task['id']]
+                    if task['state'] in ['paused', 'stopped']:
+                        finished[index] = {'task': task, 'duration': int(time.time() - started)}
+                        del running[task['id']]
+            # also covers tasks missing from the search results
+            for task_id, (index, started) in running.items():
+                if time.time() - started > self.task_timeout:
+                    self.fail_json(msg="Timeout waiting for Task {0}".format(task_id))
+        return finished
+
     def fail_from_exception(self, exc, msg):
         fail = {'msg': msg}
         if isinstance(exc, requests.exceptions.HTTPError):
@@ -801,10 +1008,98 @@ class ForemanAnsibleModule(AnsibleModule):
                 fail['error'] = exc.response.text
         self.fail_json(**fail)
 
+    def concurrent_map(self, func, items, workers, retries=0):
+        """Call func for all items on a pool of worker threads
+
+            Failures inside func, including calls to fail_json, are passed to
+            the calling thread, where they fail the module.
+
+            Parameters:
+                func (callable): Function to call with every item
+                items (list): Items to process
+                workers (int): Maximum number of concurrent calls to func
+                retries (int): Number of times a failed call is retried (optional)
+            Return value:
+                Iterator over the results of func, in the order of items
+        """
+        def worker(item):
+            self._worker_state.active = True
+            for attempt in range(retries + 1):
+                try:
+                    return func(item)
+                except Exception:
+                    if attempt == retries:
+                        raise
+                    time.sleep(2 ** attempt)
+
+        pool = ThreadPool(max(1, min(workers, len(items))))
+        try:
+            for result in pool.imap(worker, items):
+                yield result
+        except ForemanWorkerFailure as e:
+            self.fail_json(**e.failure)
+        except Exception as e:
+            self.fail_from_exception(e, to_native(e))
+        finally:
+            pool.terminate()
+
+    def fail_json(self, **kwargs):
+        if getattr(self._worker_state, 'active', False):
+            raise ForemanWorkerFailure(kwargs)
+        super(ForemanAnsibleModule, self).fail_json(**kwargs)
+
     def exit_json(self, changed=False, **kwargs):
         kwargs['changed'] = changed or self.changed
         super(ForemanAnsibleModule, self).exit_json(**kwargs)
 
+    def cache_file(self, name, key):
+        """Return the path of the file in the cache called name, that belongs to key, the server and the user"""
+        key = json.dumps([self._foremanapi_server_url, self._foremanapi_username, key], sort_keys=True)
+        return os.path.join(cache_dir(name), hashlib.sha256(to_bytes(key)).hexdigest() + '.json')
+
+    def cached(self, name, key, ttl, func):
+        """Return the result of func, cached on disk for ttl seconds
+
+            The cache entry is identified by name, key, the server and the user.
+            Concurrent callers with the same cache entry wait for the first one
+            to store its result, instead of calling func on their own.
+
+            Parameters:
+                name (string): Name of the cache, e.g. the name of the module
+                key (list): JSON serializable data identifying the cache entry
+                ttl (int): Time in seconds a cache entry stays valid
+                func (callable): Callable returning JSON serializable data
+            Return value:
+                The (cached) result of func
+        """
+        with self.locked_cache_file(name, key) as cache_file_name:
+            try:
+                if time.time() - os.stat(cache_file_name).st_mtime < ttl:
+                    with open(cache_file_name) as cache_file:
+                        return json.load(cache_file)
+            except (IOError, OSError, ValueError):
+                # no usable cache entry, fetch a new one
+                pass
+            result = func()
+            save_json_file(cache_file_name, result)
+            return result
+
+    @contextmanager
+    def locked_cache_file(self, name, key):
+        """Hold the lock of a cache entry and yield the path of its file
+
+            The cache entry is identified by name, key, the server and the user.
+            Concurrent holders of the same cache entry wait for each other,
+            so reading and writing the entry is not interleaved.
+        """
+        cache_file_name = self.cache_file(name, key)
+        with open(cache_file_name + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield cache_file_name
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
     def has_plugin(self, plugin_name):
         try:
             resource_name = _PLUGIN_RESOURCES[plugin_name]
@@ -1153,17 +1448,135 @@ def parameter_value_to_str(value, parameter_type):
     return parameter_string
 
 
+# Helper for caches
+def cache_dir(name):
+    """Return the directory for cached data of the given name, creating it if necessary"""
+    path = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'foreman-ansible-modules', name)
+    try:
+        os.makedirs(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    return path
+
+
+def load_json_file(file_name):
+    """Return the content of a JSON file, or None if it does not exist or is invalid"""
+    try:
+        with open(file_name) as json_file:
+            return json.load(json_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def save_json_file(file_name, data):
+    """Replace the JSON file atomically, so readers never see a partially written file"""
+    fd, tmp_file_name = tempfile.mkstemp(dir=os.path.dirname(file_name))
+    with os.fdopen(fd, 'w') as json_file:
+        json.dump(data, json_file)
+    os.rename(tmp_file_name, file_name)
+
+
+TIMESTAMP_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:\.\d+)?\s*(?:Z|UTC|([+-])(\d{2}):?(\d{2}))?$')
+
+
+def parse_timestamp(timestamp):
+    """Convert a timestamp like '2020-03-31 12:34:56 UTC', '2020-03-31T12:34:56.789Z' or '2020-03-31T12:34:56+0200' to seconds since the epoch"""
+    match = TIMESTAMP_RE.match(timestamp)
+    if match is None:
+        raise ValueError("Unknown timestamp format: {0}".format(timestamp))
+    date, clock, sign, hours, minutes = match.groups()
+    seconds = calendar.timegm(time.strptime('{0} {1}'.format(date, clock), '%Y-%m-%d %H:%M:%S'))
+    if sign:
+        offset = int(hours) * 3600 + int(minutes) * 60
+        seconds -= offset if sign == '+' else -offset
+    return seconds
+
+
+def manifest_identity(path):
+    """Return the consumer uuid and the creation time of the manifest, or None if the file can't be read as a manifest"""
+    try:
+        with zipfile.ZipFile(path) as manifest_zip:
+            consumer_export = BytesIO(manifest_zip.read('consumer_export.zip'))
+        with zipfile.ZipFile(consumer_export) as export_zip:
+            meta = json.loads(export_zip.read('export/meta.json').decode('utf-8'))
+            consumer = json.loads(export_zip.read('export/consumer.json').decode('utf-8'))
+        return consumer['uuid'], parse_timestamp(meta['created'])
+    except (IOError, KeyError, ValueError, zipfile.BadZipfile):
+        return None
+
+
+# Helper for content exports
+EXPORT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def file_checksum(path):
+    """Return the SHA-256 checksum of the file, reading it in chunks"""
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(EXPORT_CHUNK_SIZE), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def copy_file(source_path, destination_path):
+    """Copy a file in chunks and return the SHA-256 checksum of the copied data
+
+        The copy is written next to the destination and only renamed to it once it is complete.
+    """
+    directory = os.path.dirname(destination_path)
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    checksum = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(destination_path))
+    try:
+        with os.fdopen(fd, 'wb') as destination, open(source_path, 'rb') as source:
+            for chunk in iter(lambda: source.read(EXPORT_CHUNK_SIZE), b''):
+                destination.write(chunk)
+                checksum.update(chunk)
+        shutil.copymode(source_path, tmp_path)
+        os.rename(tmp_path, destination_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return checksum.hexdigest()
+
+
+def list_files(path):
+    """Return the paths of all files below the directory path, relative to it"""
+    files = []
+    for directory, _subdirectories, file_names in os.walk(path):
+        files.extend(os.path.relpath(os.path.join(directory, file_name), path) for file_name in file_names)
+    return sorted(files)
+
+
 # Helper for templates
+def template_metadata(template_content):
+    """Return the text of the first <%# ... %> comment of the template, or None if there is none
+
+        The template is scanned once, so the time grows linearly with its size,
+        whatever the number of % characters in it.
+    """
+    start = template_content.find('<%#')
+    if start == -1:
+        return None
+    end = template_content.find('%>', start + 3)
+    if end == -1:
+        return None
+    return template_content[start + 3:end]
+
+
 def parse_template(template_content, module):
     if not HAS_PYYAML:
         module.fail_json(msg='The PyYAML Python module is required', exception=PYYAML_IMP_ERR)
 
     try:
         template_dict = {}
-        data = re.search(
-            r'<%#([^%]*([^%]*%*[^>%])*%*)%>', template_content)
-        if data:
-            datalist = data.group(1)
+        datalist = template_metadata(template_content)
+        if datalist is not None:
             if datalist[-1] == '-':
                 datalist = datalist[:-1]
             template_dict = yaml.safe_load(datalist)
@@ -1184,6 +1597,227 @@ def parse_template_from_file(file_name, module):
     return template_dict
 
 
+template_input_foreman_spec = {
+    'id': dict(type='invisible'),
+    'name': dict(required=True),
+    'description': dict(),
+    'required': dict(type='bool'),
+    'advanced': dict(type='bool'),
+    'input_type': dict(required=True, choices=[
+        'user',
+        'fact',
+        'variable',
+        'puppet_parameter',
+    ]),
+    'fact_name': dict(),
+    'variable_name': dict(),
+    'puppet_class_name': dict(),
+    'puppet_parameter_name': dict(),
+    'options': dict(type='list', elements='raw'),
+    'value_type': dict(choices=[
+        'plain',
+        'search',
+        'date',
+    ]),
+    'resource_type': dict(),
+}
+
+
+def ensure_template_inputs(module, job_template, template_inputs, existing=True):
+    scope = {'template_id': job_template['id']}
+
+    current_template_input_list = module.list_resource('template_inputs', params=scope) if existing else []
+    current_template_inputs = {item['name']: item for item in current_template_input_list}
+    for template_input_dict in template_inputs:
+        template_input_dict = {key: value for key, value in template_input_dict.items() if value is not None}
+
+        template_input_entity = current_template_inputs.pop(template_input_dict['name'], None)
+
+        module.ensure_entity(
+            'template_inputs', template_input_dict, template_input_entity,
+            params=scope, foreman_spec=template_input_foreman_spec,
+        )
+
+    # At this point, desired template inputs have been removed from the dict.
+    for template_input_entity in current_template_inputs.values():
+        module.ensure_entity(
+            'template_inputs', None, template_input_entity, state="absent",
+            params=scope, foreman_spec=template_input_foreman_spec,
+        )
+
+
+_TEMPLATE_TAXONOMY_SPEC = dict(
+    id=dict(type='invisible'),
+    organizations=dict(type='entity_list'),
+    locations=dict(type='entity_list'),
+)
+
+TEMPLATE_SYNC_SPECS = {
+    'provisioning_templates': dict(
+        name=dict(),
+        template=dict(),
+        snippet=dict(type='bool'),
+        kind=dict(type='entity', flat_name='template_kind_id'),
+        locked=dict(type='bool'),
+        **_TEMPLATE_TAXONOMY_SPEC
+    ),
+    'ptables': dict(
+        name=dict(),
+        layout=dict(),
+        os_family=dict(),
+        locked=dict(type='bool'),
+        **_TEMPLATE_TAXONOMY_SPEC
+    ),
+    'job_templates': dict(
+        name=dict(),
+        template=dict(),
+        snippet=dict(type='bool'),
+        job_category=dict(),
+        provider_type=dict(),
+        description_format=dict(),
+        locked=dict(type='bool'),
+        **_TEMPLATE_TAXONOMY_SPEC
+    ),
+}
+
+
+def template_resource(template_dict):
+    """Return the resource a parsed template belongs to, from the model in its metadata or the kind of template it describes"""
+    model = template_dict.get('model')
+    if model == 'Ptable' or (model is None and template_dict.get('kind') == 'ptable'):
+        return 'ptables'
+    if model == 'JobTemplate' or (model is None and 'job_category' in template_dict):
+        return 'job_templates'
+    return 'provisioning_templates'
+
+
+def template_entity(template_dict, file_name, template_kinds, overrides):
+    """Turn a parsed template into the desired entity of its resource, the way the template modules do"""
+    resource = template_resource(template_dict)
+    entity = {
+        'name': template_dict.get('name') or os.path.splitext(os.path.basename(file_name))[0],
+        'locked': template_dict.get('locked', False),
+    }
+    if resource == 'ptables':
+        entity['layout'] = template_dict['template']
+        os_family = template_dict.get('os_family', template_dict.get('oses'))
+        if isinstance(os_family, list):
+            os_family = os_family[0] if os_family else None
+        if os_family:
+            entity['os_family'] = os_family
+    else:
+        entity['template'] = template_dict['template']
+    if resource == 'provisioning_templates' and 'kind' in template_dict:
+        entity['snippet'] = template_dict['kind'] == 'snippet'
+        if not entity['snippet']:
+            if template_dict['kind'] not in template_kinds:
+                raise ValueError("Unknown template kind {0}".format(template_dict['kind']))
+            entity['kind'] = template_kinds[template_dict['kind']]
+    if resource == 'job_templates':
+        entity['job_category'] = template_dict.get('job_category', 'unknown')
+        entity['provider_type'] = template_dict.get('provider_type', 'SSH')
+        for key in ('snippet', 'description_format'):
+            if key in template_dict:
+                entity[key] = template_dict[key]
+    entity.update(overrides)
+    return resource, entity
+
+
+def sync_templates(module, templates, concurrency, overrides=None):
+    """Create or update provisioning templates, partition tables and job templates from parsed template files
+
+        The existing templates of every resource are fetched with one paged listing. The
+        checksum of every desired template is compared locally with the one recorded the last
+        time the template was synced, together with its updated_at. Templates that did not
+        change on either side are neither fetched nor sent, the others are compared with the
+        server and updated concurrently.
+
+        Parameters:
+            module (ForemanAnsibleModule): Module connected to the server
+            templates (list): (file name, parse_template result) tuples
+            concurrency (int): Maximum number of templates updated at the same time
+            overrides (dict): Properties set on every template, e.g. organizations and locations
+        Return value:
+            List of dicts with the 'file', 'name', 'resource', 'id' and 'changed' of every template
+    """
+    template_kinds = {}
+    if any(template_resource(template_dict) == 'provisioning_templates' and template_dict.get('kind', 'snippet') != 'snippet'
+           for _file_name, template_dict in templates):
+        template_kinds = {kind['name']: kind for kind in module.list_resource('template_kinds')}
+
+    desired = []
+    for file_name, template_dict in templates:
+        try:
+            resource, entity = template_entity(template_dict, file_name, template_kinds, overrides or {})
+        except (KeyError, ValueError) as e:
+            module.fail_json(msg="Error while reading template file {0}: {1}".format(file_name, to_native(e)))
+        template_inputs = template_dict.get('template_inputs') if resource == 'job_templates' else None
+        flat_entity = _flatten_entity(entity, _foreman_spec_helper(TEMPLATE_SYNC_SPECS[resource])[0])
+        checksum = hashlib.sha256(to_bytes(json.dumps([flat_entity, template_inputs], sort_keys=True))).hexdigest()
+        desired.append({'file': file_name, 'resource': resource, 'entity': entity, 'template_inputs': template_inputs, 'checksum': checksum})
+
+    duplicates = set()
+    seen = set()
+    for template in desired:
+        key = (template['resource'], template['entity']['name'])
+        if key in seen:
+            duplicates.add(template['entity']['name'])
+        seen.add(key)
+    if duplicates:
+        module.fail_json(msg="Several template files define the templates {0}".format(', '.join(sorted(duplicates))))
+
+    existing = {}
+    for resource in sorted(set(template['resource'] for template in desired)):
+        existing[resource] = {entity['name']: entity for entity in module.iter_resource(resource)}
+
+    with module.locked_cache_file('template_sync', 'state') as state_file_name:
+        state = load_json_file(state_file_name) or {}
+
+    def synced(template, current):
+        recorded = state.get(template['resource'], {}).get(str(current['id']))
+        return recorded == {'checksum': template['checksum'], 'updated_at': current.get('updated_at')}
+
+    pending = []
+    results = []
+    for template in desired:
+        current = existing[template['resource']].get(template['entity']['name'])
+        result = {'file': template['file'], 'name': template['entity']['name'], 'resource': template['resource'],
+                  'id': current and current['id'], 'changed': False}
+        results.append(result)
+        if current is None or not synced(template, current):
+            pending.append((template, current, result))
+
+    def push(item):
+        template, current, result = item
+        if current is not None:
+            current = module.show_resource(template['resource'], current['id'])
+        module._worker_state.changed = False
+        new_entity = module.ensure_entity(template['resource'], template['entity'], current, state='present',
+                                          foreman_spec=TEMPLATE_SYNC_SPECS[template['resource']])
+        if template['template_inputs'] is not None:
+            ensure_template_inputs(module, new_entity, template['template_inputs'], existing=current is not None)
+        result['id'] = new_entity['id']
+        result['changed'] = getattr(module._worker_state, 'changed', False)
+        # an unchanged entity comes back flattened, without its updated_at
+        return new_entity.get('updated_at') or (current or {}).get('updated_at')
+
+    synced_state = {}
+    for (template, _current, result), updated_at in zip(pending, module.concurrent_map(push, pending, concurrency)):
+        synced_state.setdefault(template['resource'], {})[str(result['id'])] = {
+            'checksum': template['checksum'],
+            'updated_at': updated_at,
+        }
+
+    if synced_state and not module.check_mode:
+        # merge with the state other runs recorded since it was read
+        with module.locked_cache_file('template_sync', 'state') as state_file_name:
+            state = load_json_file(state_file_name) or {}
+            for resource, resource_state in synced_state.items():
+                state.setdefault(resource, {}).update(resource_state)
+            save_json_file(state_file_name, state)
+    return results
+
+
 # Helper for titles
 def split_fqn(title):
     """ Split fully qualified name (title) in name and parent title """
@@ -287,8 +287,10 @@ RETURN = ''' # '''
 import os
 from ansible.module_utils.foreman_helper import (
     ForemanTaxonomicEntityAnsibleModule,
+    ensure_template_inputs,
     parse_template,
     parse_template_from_file,
+    template_input_foreman_spec,
 )
 
 
@@ -298,31 +300,6 @@ template_defaults = {
 }
 
 
-template_input_foreman_spec = {
-    'name': dict(required=True),
-    'description': dict(),
-    'required': dict(type='bool'),
-    'advanced': dict(type='bool'),
-    'input_type': dict(required=True, choices=[
-        'user',
-        'fact',
-        'variable',
-        'puppet_parameter',
-    ]),
-    'fact_name': dict(),
-    'variable_name': dict(),
-    'puppet_class_name': dict(),
-    'puppet_parameter_name': dict(),
-    'options': dict(type='list', elements='raw'),
-    'value_type': dict(choices=[
-        'plain',
-        'search',
-        'date',
-    ]),
-    'resource_type': dict(),
-}
-
-
 class ForemanJobTemplateModule(ForemanTaxonomicEntityAnsibleModule):
     pass
 
@@ -426,27 +403,7 @@ def main():
 
             update_dependent_entities = (module.state == 'present' or (module.state == 'present_with_defaults' and module.changed))
             if update_dependent_entities and template_inputs is not None:
-                scope = {'template_id': job_template['id']}
-
-                # Manage TemplateInputs here
-                current_template_input_list = module.list_resource('template_inputs', params=scope) if entity else []
-                current_template_inputs = {item['name']: item for item in current_template_input_list}
-                for template_input_dict in template_inputs:
-                    template_input_dict = {key: value for key, value in template_input_dict.items() if value is not None}
-
-                    template_input_entity = current_template_inputs.pop(template_input_dict['name'], None)
-
-                    module.ensure_entity(
-                        'template_inputs', template_input_dict, template_input_entity,
-                        params=scope, foreman_spec=template_input_foreman_spec,
-                    )
-
-                # At this point, desired template inputs have been removed from the dict.
-                for template_input_entity in current_template_inputs.values():
-                    module.ensure_entity(
-                        'template_inputs', None, template_input_entity, state="absent",
-                        params=scope, foreman_spec=template_input_foreman_spec,
-                    )
+                ensure_template_inputs(module, job_template, template_inputs, existing=bool(entity))
 
 
 if __name__ == '__main__':
@@ -59,6 +59,36 @@ options:
     type: bool
     default: false
     aliases: [ info ]
+  fields:
+    description:
+      - Only return these fields of the found resources.
+      - Nested fields can be selected using a dot, e.g. I(organization.name).
+      - When set, the results are fetched and reduced page by page, which keeps the memory usage low for big result sets.
+    type: list
+    elements: str
+  columnar:
+    description:
+      - If C(True) return the results as one list per field in I(columns) instead of a list of resources.
+      - Requires I(fields) to be set.
+    type: bool
+    default: false
+  dest:
+    description:
+      - Write the found resources to this file instead of returning them, one JSON document per line.
+      - The results are fetched page by page and written as they arrive, so they never have to be held in memory at once.
+    type: path
+  compress:
+    description:
+      - If C(True) gzip the file written to I(dest).
+    type: bool
+    default: false
+  cache_ttl:
+    description:
+      - Cache the results on disk for this many seconds.
+      - Calls with the same I(resource), I(search), I(params) and user on the same server return the cached results instead of searching again.
+      - Concurrent calls wait for the first one to store its results, instead of all searching at the same time.
+      - If unset, nothing is cached.
+    type: int
 notes:
   - Some resources don't support scoping and will return errors when you pass I(organization) or unknown data in I(params).
 extends_documentation_fragment:
@@ -121,18 +151,143 @@ EXAMPLES = '''
   register: result
 - debug:
     var: result
+
+- name: Get name and version of all packages in organization ACME (Katello)
+  foreman_search_facts:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    resource: packages
+    organization: ACME
+    fields:
+      - name
+      - version
+    columnar: true
+  register: result
+- debug:
+    var: result.columns.name
+
+- name: Write all hosts to a gzipped NDJSON file
+  foreman_search_facts:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    resource: hosts
+    dest: /srv/inventory/hosts.ndjson.gz
+    compress: true
+
+- name: Search the capsules once for all hosts of the play
+  foreman_search_facts:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    resource: smart_proxies
+    search: feature = "Pulp Node"
+    cache_ttl: 600
+  register: result
 '''
 
 RETURN = '''
 resources:
   description: Search results from Foreman
-  returned: always
+  returned: unless I(columnar) or I(dest) are set
   type: list
+columns:
+  description: Search results from Foreman, as a dict with one list of values per field in I(fields)
+  returned: when I(columnar) is true
+  type: dict
+count:
+  description: Number of resources written to I(dest)
+  returned: when I(dest) is set
+  type: int
+checksum:
+  description: SHA256 checksum of the file written to I(dest)
+  returned: when I(dest) is set
+  type: str
 '''
 
+import gzip
+import json
+import os
+import tempfile
+
 from ansible.module_utils.foreman_helper import ForemanAnsibleModule
 
 
+def project_resource(resource, fields):
+    """Reduce a resource to the given fields, nested fields are addressed as 'parent.child'"""
+    projection = {}
+    for field in fields:
+        value = resource
+        for key in field.split('.'):
+            value = value.get(key) if isinstance(value, dict) else None
+        projection[field] = value
+    return projection
+
+
+def write_resources(module, resources, dest, compress):
+    """Write resources as NDJSON to dest, return the number of written resources and the checksum of the file"""
+    count = 0
+    fd, tmp_dest = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)))
+    try:
+        with os.fdopen(fd, 'wb') as dest_file:
+            if compress:
+                # a fixed mtime keeps the checksum stable when the content did not change
+                output = gzip.GzipFile(filename=dest, mode='wb', fileobj=dest_file, mtime=0)
+            else:
+                output = dest_file
+            for found_resource in resources:
+                output.write(json.dumps(found_resource, sort_keys=True).encode('utf-8') + b'\n')
+                count += 1
+            if compress:
+                output.close()
+        checksum = module.sha256(tmp_dest)
+        if not os.path.exists(dest) or module.sha256(dest) != checksum:
+            if not module.check_mode:
+                module.atomic_move(tmp_dest, dest)
+            module.set_changed()
+    finally:
+        # only left behind when nothing changed, in check mode or when writing failed
+        if os.path.exists(tmp_dest):
+            os.remove(tmp_dest)
+    return count, checksum
+
+
+def search_resources(module, resource, search, params, dest=None):
+    module_params = module.foreman_params
+    fields = module_params.get('fields')
+
+    module.connect()
+    if resource not in module.foremanapi.resources:
+        msg = "Resource '{0}' does not exist in the API. Existing resources: {1}".format(resource, ', '.join(sorted(module.foremanapi.resources)))
+        module.fail_json(msg=msg)
+    if 'organization' in module_params:
+        params['organization_id'] = module.find_resource_by_name('organizations', module_params['organization'], thin=True)['id']
+
+    if fields or dest:
+        response = module.iter_resource(resource, search, params)
+    else:
+        response = module.list_resource(resource, search, params)
+
+    if module_params['full_details']:
+        response = (module.show_resource(resource, found_resource['id'], params) for found_resource in response)
+
+    if fields:
+        response = (project_resource(found_resource, fields) for found_resource in response)
+
+    if dest:
+        count, checksum = write_resources(module, response, dest, module_params['compress'])
+        return dict(dest=dest, count=count, checksum=checksum)
+    elif module_params['columnar']:
+        columns = dict((field, []) for field in fields)
+        for found_resource in response:
+            for field in fields:
+                columns[field].append(found_resource[field])
+        return dict(columns=columns)
+    else:
+        return dict(resources=list(response))
+
+
 def main():
 
     module = ForemanAnsibleModule(
@@ -142,7 +297,19 @@ def main():
             full_details=dict(type='bool', aliases=['info'], default='false'),
             params=dict(type='dict'),
             organization=dict(),
+            fields=dict(type='list', elements='str'),
+            columnar=dict(type='bool', default=False),
+            dest=dict(type='path'),
+            compress=dict(type='bool', default=False),
+            cache_ttl=dict(type='int'),
         ),
+        required_if=[
+            ['columnar', True, ['fields']],
+        ],
+        mutually_exclusive=[
+            ['columnar', 'dest'],
+            ['cache_ttl', 'dest'],
+        ],
     )
 
     module_params = module.foreman_params
@@ -150,23 +317,15 @@ def main():
     search = module_params['search']
     params = module_params.get('params', {})
 
-    with module.api_connection():
-        if resource not in module.foremanapi.resources:
-            msg = "Resource '{0}' does not exist in the API. Existing resources: {1}".format(resource, ', '.join(sorted(module.foremanapi.resources)))
-            module.fail_json(msg=msg)
-        if 'organization' in module_params:
-            params['organization_id'] = module.find_resource_by_name('organizations', module_params['organization'], thin=True)['id']
-
-        response = module.list_resource(resource, search, params)
-
-        if module_params['full_details']:
-            resources = []
-            for found_resource in response:
-                resources.append(module.show_resource(resource, found_resource['id'], params))
-        else:
-            resources = response
+    if 'cache_ttl' in module_params:
+        cache_key = [resource, search, params]
+        cache_key.extend(module_params.get(key) for key in ['organization', 'full_details', 'fields', 'columnar'])
+        result = module.cached('search_facts', cache_key, module_params['cache_ttl'],
+                               lambda: search_resources(module, resource, search, params))
+    else:
+        result = search_resources(module, resource, search, params, dest=module_params.get('dest'))
 
-        module.exit_json(resources=resources)
+    module.exit_json(**result)
 
 
 if __name__ == '__main__':
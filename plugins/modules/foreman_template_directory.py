@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# (c) 2020, The Foreman Project
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: foreman_template_directory
+short_description: Sync a directory of templates to Foreman
+description:
+  - Create or update the provisioning templates, partition tables and job templates of all template files in a directory
+  - The kind of every template is taken from the C(model) in its metadata, like in exports of the foreman_templates plugin.
+    Without a model, templates of C(kind) ptable are partition tables, templates with a C(job_category) are job templates
+    and all others are provisioning templates.
+  - The name is taken from the metadata or the file name, like in M(foreman_provisioning_template),
+    M(foreman_ptable) and M(foreman_job_template)
+  - The existing templates of every kind are listed once. Templates that neither changed in the directory nor on the server
+    since the last sync are recognized by a checksum and skipped without being transferred.
+    All other templates are compared with the server and updated concurrently.
+  - The checksums are recorded in C(~/.cache/foreman-ansible-modules) (or below C($XDG_CACHE_HOME)) of the host running the module,
+    which is the Ansible controller only for tasks running on localhost. Runs on other hosts do not know about them and compare all templates with the server.
+author: "The Foreman Project (@theforeman)"
+notes:
+  - Templates that are not in the directory are left alone.
+options:
+  path:
+    description:
+      - Directory containing the template files, including its subdirectories
+    required: true
+    type: path
+  patterns:
+    description:
+      - Shell patterns the names of template files match
+    default:
+      - "*.erb"
+    type: list
+    elements: str
+  locked:
+    description:
+      - Lock or unlock all templates, instead of using the C(locked) of their metadata
+    type: bool
+  concurrency:
+    description:
+      - Number of templates updated at the same time
+    default: 4
+    type: int
+extends_documentation_fragment:
+  - foreman
+  - foreman.taxonomy
+'''
+
+EXAMPLES = '''
+- name: "Sync the templates of the community-templates checkout"
+  foreman_template_directory:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    path: /srv/community-templates
+    organizations:
+      - "Default Organization"
+    locations:
+      - "Default Location"
+    concurrency: 8
+'''
+
+RETURN = '''
+templates:
+  description: The synced templates
+  returned: always
+  type: list
+  elements: dict
+  contains:
+    file:
+      description: Path of the template file
+      type: str
+    name:
+      description: Name of the template
+      type: str
+    resource:
+      description: Kind of the template, C(provisioning_templates), C(ptables) or C(job_templates)
+      type: str
+    id:
+      description: Id of the template
+      type: int
+    changed:
+      description: Whether the template was created or updated
+      type: bool
+'''
+
+import fnmatch
+import os
+
+from ansible.module_utils.foreman_helper import ForemanAnsibleModule, list_files, parse_template_from_file, sync_templates
+
+
+def find_template_files(module):
+    path = module.foreman_params['path']
+    if not os.path.isdir(path):
+        module.fail_json(msg="{0} is not a directory".format(path))
+    return [os.path.join(path, file_name) for file_name in list_files(path)
+            if any(fnmatch.fnmatch(os.path.basename(file_name), pattern) for pattern in module.foreman_params['patterns'])]
+
+
+def main():
+    module = ForemanAnsibleModule(
+        foreman_spec=dict(
+            path=dict(type='path', required=True),
+            patterns=dict(type='list', elements='str', default=['*.erb']),
+            locked=dict(type='bool'),
+            organizations=dict(type='entity_list'),
+            locations=dict(type='entity_list'),
+            concurrency=dict(type='int', default=4),
+        ),
+    )
+
+    templates = []
+    for file_name in find_template_files(module):
+        template_dict = parse_template_from_file(file_name, module)
+        if template_dict.get('name') == '*':
+            module.fail_json(msg="Cannot use '*' as a template name in {0}!".format(file_name))
+        templates.append((file_name, template_dict))
+
+    with module.api_connection():
+        overrides = {}
+        for key in ('organizations', 'locations'):
+            if key in module.foreman_params:
+                overrides[key] = module.lookup_entity(key)
+        if 'locked' in module.foreman_params:
+            overrides['locked'] = module.foreman_params['locked']
+
+        results = sync_templates(module, templates, module.foreman_params['concurrency'], overrides)
+        module.exit_json(templates=results)
+
+
+if __name__ == '__main__':
+    main()
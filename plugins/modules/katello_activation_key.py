@@ -63,6 +63,13 @@ options:
           - Mutually exclusive with I(name).
         type: str
         required: false
+  subscriptions_cache_ttl:
+    description:
+      - List all subscriptions of the organization once and cache them on disk for this many seconds.
+      - Activation keys of the same organization managed within this time, e.g. in a loop, resolve their I(subscriptions)
+        from the cached list instead of searching the server again.
+      - If unset, the I(subscriptions) of the activation key are resolved with one search and nothing is cached.
+    type: int
   host_collections:
     description:
       - List of host collections to add to activation key
@@ -221,6 +228,7 @@ def main():
                 required_one_of=[['name', 'pool_id']],
                 mutually_exclusive=[['name', 'pool_id']],
             ),
+            subscriptions_cache_ttl=dict(type='int'),
             content_overrides=dict(type='list', elements='dict', options=dict(
                 label=dict(required=True),
                 override=dict(required=True, choices=['enabled', 'disabled', 'default']),
@@ -244,6 +252,7 @@ def main():
                 module.exit_json()
 
         subscriptions = module.foreman_params.pop('subscriptions', None)
+        subscriptions_cache_ttl = module.foreman_params.pop('subscriptions_cache_ttl', None)
         content_overrides = module.foreman_params.pop('content_overrides', None)
         if not module.desired_absent:
             module.lookup_entity('host_collections')
@@ -261,12 +270,7 @@ def main():
 
             ak_scope = {'activation_key_id': activation_key['id']}
             if subscriptions is not None:
-                desired_subscriptions = []
-                for subscription in subscriptions:
-                    if subscription['name'] is not None and subscription['pool_id'] is None:
-                        desired_subscriptions.append(module.find_resource_by_name('subscriptions', subscription['name'], params=scope, thin=True))
-                    if subscription['pool_id'] is not None:
-                        desired_subscriptions.append(module.find_resource_by_id('subscriptions', subscription['pool_id'], params=scope, thin=True))
+                desired_subscriptions = module.find_subscriptions(subscriptions, params=scope, cache_ttl=subscriptions_cache_ttl)
                 desired_subscription_ids = set(item['id'] for item in desired_subscriptions)
                 current_subscriptions = module.list_resource('subscriptions', params=ak_scope) if entity else []
                 current_subscription_ids = set(item['id'] for item in current_subscriptions)
@@ -178,11 +178,7 @@ def main():
                 if module.foreman_params['composite']:
                     module.fail_json(msg="Repositories cannot be parts of a Composite Content View.")
                 else:
-                    repositories = []
-                    for repository in module.foreman_params['repositories']:
-                        product = module.find_resource_by_name('products', repository['product'], params=scope, thin=True)
-                        repositories.append(module.find_resource_by_name('repositories', repository['name'], params={'product_id': product['id']}, thin=True))
-                    module.foreman_params['repositories'] = repositories
+                    module.foreman_params['repositories'] = module.find_repositories(module.foreman_params['repositories'], params=scope)
 
         content_view_entity = module.run()
 
@@ -139,6 +139,81 @@ options:
     description:
       - Include all RPMs with no errata
     type: bool
+  rules:
+    description:
+      - List of rules of the content view filter, instead of the single rule described by the rule options above
+      - The existing rules of the filter are fetched once and compared with the list, only the differences are applied
+      - Rules are identified by I(rule_name) and I(architecture) for rpm filters, by I(rule_name) for package_group and docker filters,
+        and by I(errata_id) for erratum filters. An erratum rule without I(errata_id) is the date range rule of the filter.
+    type: list
+    elements: dict
+    suboptions:
+      rule_name:
+        description:
+          - Content view filter rule name or package name
+        aliases:
+          - package_name
+          - package_group
+          - tag
+        type: str
+      architecture:
+        description:
+          - package architecture
+        type: str
+      version:
+        description:
+          - package version
+        type: str
+      min_version:
+        description:
+          - package minimum version
+        type: str
+      max_version:
+        description:
+          - package maximum version
+        type: str
+      errata_id:
+        description:
+          - erratum id
+        type: str
+      date_type:
+        description:
+          - Search using the 'Issued On' or 'Updated On'
+        choices:
+          - issued
+          - updated
+        type: str
+      start_date:
+        description:
+          - erratum start date (YYYY-MM-DD)
+        type: str
+      end_date:
+        description:
+          - erratum end date (YYYY-MM-DD)
+        type: str
+      types:
+        description:
+          - erratum types (enhancement, bugfix, security)
+        type: list
+        elements: str
+      state:
+        description:
+          - State of the rule
+        default: present
+        choices:
+          - present
+          - absent
+        type: str
+  purge_rules:
+    description:
+      - Remove all rules of the filter that are not listed in I(rules)
+    default: false
+    type: bool
+  concurrency:
+    description:
+      - Number of rules that are created, updated or removed at the same time
+    default: 4
+    type: int
 extends_documentation_fragment:
   - foreman
   - foreman.organization
@@ -168,6 +243,23 @@ EXAMPLES = '''
     package_name: tcsh
     min_version: 6.20.00
     inclusion: True
+
+- name: Exclude a list of packages and nothing else
+  katello_content_view_filter:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    name: "package filter 2"
+    organization: "Default Organization"
+    content_view: Web Servers
+    filter_type: "rpm"
+    rules:
+      - package_name: tcsh
+      - package_name: kernel
+        max_version: 3.10.0
+      - package_name: zsh
+        architecture: x86_64
+    purge_rules: true
 '''
 
 RETURN = ''' # '''
@@ -221,6 +313,96 @@ content_filter_rule_docker_spec = {
 }
 
 
+# fields identifying a rule of a filter and fields that can be updated, by filter type
+content_filter_rule_keys = {
+    'rpm': (('name', 'architecture'), ('version', 'min_version', 'max_version')),
+    'package_group': (('name',), ('uuid',)),
+    'docker': (('name',), ()),
+    'erratum': (('errata_id',), ('date_type', 'start_date', 'end_date', 'types')),
+}
+
+content_filter_rule_fields = (
+    'name', 'architecture', 'version', 'min_version', 'max_version', 'uuid', 'errata_id', 'date_type', 'start_date', 'end_date', 'types',
+)
+
+
+def normalize_rule_value(value):
+    if isinstance(value, list):
+        return sorted(value)
+    return value or None
+
+
+def rule_key(filter_type, rule):
+    return tuple(normalize_rule_value(rule.get(field)) for field in content_filter_rule_keys[filter_type][0])
+
+
+def ensure_rules(module, content_view_filter, filter_type, rules, purge, concurrency, new_filter=False):
+    """Bring the rules of the filter in line with the list of rules, fetching the existing rules once"""
+    cv_filter_scope = {'content_view_filter_id': content_view_filter['id']}
+    key_fields, update_fields = content_filter_rule_keys[filter_type]
+
+    desired_rules = []
+    for rule in rules:
+        desired = dict(rule)
+        desired['name'] = desired.pop('rule_name', None)
+        if filter_type == 'erratum' and not desired.get('errata_id'):
+            if desired.get('date_type') is None:
+                desired['date_type'] = 'updated'
+            if desired.get('types') is None:
+                desired['types'] = ['bugfix', 'enhancement', 'security']
+        desired_rules.append(desired)
+
+    if filter_type == 'package_group':
+        names = [rule['name'] for rule in desired_rules if rule['state'] == 'present']
+        searches = ['name="{0}"'.format(name) for name in names]
+        package_groups = module.list_resource_by_searches('package_groups', searches, params=module.scope_for('organization'))
+        package_groups = {package_group['name']: package_group for package_group in package_groups}
+        missing = [name for name in names if name not in package_groups]
+        if missing:
+            module.fail_json(msg="Could not find package groups: {0}".format(', '.join(missing)))
+        for rule in desired_rules:
+            if rule['state'] == 'present':
+                rule['uuid'] = package_groups[rule['name']]['uuid']
+
+    all_rules = [] if new_filter else module.list_resource('content_view_filter_rules', params=cv_filter_scope)
+    existing_rules = {}
+    for existing_rule in all_rules:
+        existing_rules.setdefault(rule_key(filter_type, existing_rule), existing_rule)
+
+    actions = []
+    kept_ids = set()
+    for desired in desired_rules:
+        current = existing_rules.get(rule_key(filter_type, desired))
+        if desired['state'] == 'absent':
+            if current is not None:
+                actions.append(('destroy', {'id': current['id']}))
+        elif current is None:
+            actions.append(('create', {field: desired[field] for field in content_filter_rule_fields if desired.get(field) is not None}))
+        else:
+            kept_ids.add(current['id'])
+            # the dates and types only apply to errata rules without an errata id, the server fills in a date_type anyway
+            rule_update_fields = () if filter_type == 'erratum' and desired.get('errata_id') else update_fields
+            # fields that are no longer wanted are cleared, e.g. the version of a rule that switches to a version range
+            changes = {field: desired.get(field) for field in rule_update_fields
+                       if normalize_rule_value(desired.get(field)) != normalize_rule_value(current.get(field))}
+            if changes:
+                changes['id'] = current['id']
+                actions.append(('update', changes))
+    if purge:
+        destroyed_ids = {params['id'] for action, params in actions if action == 'destroy'}
+        actions.extend(('destroy', {'id': existing_rule['id']}) for existing_rule in all_rules
+                       if existing_rule['id'] not in kept_ids and existing_rule['id'] not in destroyed_ids)
+
+    def apply(action):
+        name, params = action
+        params = dict(params)
+        params.update(cv_filter_scope)
+        module.resource_action('content_view_filter_rules', name, params)
+
+    for _result in module.concurrent_map(apply, actions, concurrency):
+        pass
+
+
 class KatelloContentViewFilterModule(KatelloAnsibleModule):
     pass
 
@@ -247,7 +429,24 @@ def main():
             types=dict(default=["bugfix", "enhancement", "security"], type='list', elements='str'),
             version=dict(),
             architecture=dict(),
+            rules=dict(type='list', elements='dict', options=dict(
+                rule_name=dict(aliases=['package_name', 'package_group', 'tag']),
+                architecture=dict(),
+                version=dict(),
+                min_version=dict(),
+                max_version=dict(),
+                errata_id=dict(),
+                date_type=dict(choices=['issued', 'updated']),
+                start_date=dict(),
+                end_date=dict(),
+                types=dict(type='list', elements='str'),
+                state=dict(default='present', choices=['present', 'absent']),
+            )),
+            purge_rules=dict(type='bool', default=False),
+            concurrency=dict(type='int', default=4),
         ),
+        mutually_exclusive=[['rules', option] for option in
+                            ['rule_name', 'errata_id', 'architecture', 'version', 'min_version', 'max_version', 'start_date', 'end_date']],
     )
 
     # TODO Maybe refactor this into a EntityMixin
@@ -272,12 +471,7 @@ def main():
 
         cv_scope = module.scope_for('content_view')
         if module.foreman_params['repositories']:
-            repositories = []
-            for repo in module.foreman_params['repositories']:
-                product = module.find_resource_by_name('products', repo['product'], params=scope, thin=True)
-                product_scope = {'product_id': product['id']}
-                repositories.append(module.find_resource_by_name('repositories', repo['name'], params=product_scope, thin=True))
-            module.foreman_params['repositories'] = repositories
+            module.foreman_params['repositories'] = module.find_repositories(module.foreman_params['repositories'], params=scope)
 
         entity = module.lookup_entity('entity')
         content_view_filter = module.ensure_entity(
@@ -289,7 +483,10 @@ def main():
             foreman_spec=content_filter_spec,
         )
 
-        if content_view_filter is not None:
+        if content_view_filter is not None and 'rules' in module.foreman_params:
+            ensure_rules(module, content_view_filter, module.foreman_params['filter_type'], module.foreman_params['rules'],
+                         module.foreman_params['purge_rules'], module.foreman_params['concurrency'], new_filter=entity is None)
+        elif content_view_filter is not None:
             cv_filter_scope = {'content_view_filter_id': content_view_filter['id']}
             if 'errata_id' in module.foreman_params:
                 # should we try to find the errata the user is asking for? or just pass it blindly?
@@ -0,0 +1,253 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# (c) 2020, The Foreman Project
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: katello_content_view_publish
+short_description: Publish and promote many Katello Content Views at once
+description:
+  - Publish new versions of many Katello Content Views and promote them to Lifecycle Environments
+  - Content Views are published concurrently, Composite Content Views only after the published Content Views they are composed of
+  - The new versions are then promoted along the Lifecycle Environment paths, to the Lifecycle Environments at the same position
+    of all paths with one task per version, as promoting a version locks its Content View
+  - All publish and promote tasks are tracked together
+author: "The Foreman Project (@theforeman)"
+notes:
+  - Every run publishes new versions, this module is not idempotent.
+  - Use M(katello_content_view_version) to publish or promote a single Content View idempotently.
+options:
+  content_views:
+    description:
+      - Names of the Content Views and Composite Content Views to publish
+    required: true
+    type: list
+    elements: str
+  lifecycle_environments:
+    description:
+      - Lifecycle Environments the new versions are promoted to
+      - The Lifecycle Environments of one path are promoted to in the order of the path,
+        so list every Lifecycle Environment on the way unless I(force_promote) is set.
+    type: list
+    elements: str
+  description:
+    description:
+      - Description of the new Content View Versions
+    type: str
+  force_promote:
+    description:
+      - Force content view promotion and bypass lifecycle environment restriction
+    default: false
+    type: bool
+    aliases:
+      - force
+  force_yum_metadata_regeneration:
+    description:
+      - Force metadata regeneration when performing Publish and Promote tasks
+    type: bool
+    default: false
+  concurrency:
+    description:
+      - Number of publish or promote tasks running at the same time
+    default: 4
+    type: int
+extends_documentation_fragment:
+  - foreman
+  - foreman.organization
+'''
+
+EXAMPLES = '''
+- name: "Publish the monthly patches and promote them to Dev and QA"
+  katello_content_view_publish:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    organization: "Default Organization"
+    content_views:
+      - "RHEL 7 Base"
+      - "RHEL 7 Extras"
+      - "RHEL 7 Webserver"  # a composite of the two above
+    lifecycle_environments:
+      - Dev
+      - QA
+    concurrency: 8
+'''
+
+RETURN = '''
+content_views:
+  description: Outcome of the publish and the promotions of every Content View
+  returned: always
+  type: list
+  elements: dict
+  contains:
+    id:
+      description: Id of the Content View
+      type: int
+    name:
+      description: Name of the Content View
+      type: str
+    composite:
+      description: Whether the Content View is a Composite Content View
+      type: bool
+    content_view_version_id:
+      description: Id of the published Content View Version
+      type: int
+    publish:
+      description: Id, result and duration of the publish task
+      type: dict
+    promotions:
+      description: Lifecycle Environments, task id, result and duration of every promotion
+      type: list
+      elements: dict
+'''
+
+
+from ansible.module_utils.foreman_helper import KatelloAnsibleModule
+
+
+def publish_stages(content_views):
+    """Order content views into stages, every composite comes after all its components that are published as well"""
+    ids = {content_view['id'] for content_view in content_views}
+    dependencies = {}
+    for content_view in content_views:
+        components = {component['content_view']['id'] for component in content_view.get('content_view_components') or []}
+        dependencies[content_view['id']] = components & ids
+    stages = []
+    done = set()
+    remaining = list(content_views)
+    while remaining:
+        stage = [content_view for content_view in remaining if dependencies[content_view['id']] <= done]
+        stages.append(stage)
+        done.update(content_view['id'] for content_view in stage)
+        remaining = [content_view for content_view in remaining if content_view['id'] not in done]
+    return stages, dependencies
+
+
+def promotion_stages(module, environments, scope):
+    """Order the environments by their position on their environment path"""
+    paths = module.resource_action('lifecycle_environments', 'paths', scope, ignore_check_mode=True, record_change=False)
+    if isinstance(paths, dict):
+        paths = paths['results']
+    positions = {}
+    for path in paths:
+        for position, environment in enumerate(path['environments']):
+            positions[environment['id']] = position
+    stages = {}
+    for environment in environments:
+        stages.setdefault(positions.get(environment['id'], 0), []).append(environment)
+    return [stages[position] for position in sorted(stages)]
+
+
+def task_outcome(finished):
+    task = finished['task'] or {}
+    return {'task_id': task.get('id'), 'result': task.get('result'), 'duration': finished['duration']}
+
+
+def main():
+    module = KatelloAnsibleModule(
+        foreman_spec=dict(
+            content_views=dict(type='list', elements='str', required=True),
+            lifecycle_environments=dict(type='entity_list', scope=['organization']),
+            description=dict(),
+            force_promote=dict(type='bool', aliases=['force'], default=False),
+            force_yum_metadata_regeneration=dict(type='bool', default=False),
+            concurrency=dict(type='int', default=4),
+        ),
+    )
+
+    module.task_timeout = 60 * 60
+
+    with module.api_connection():
+        scope = module.scope_for('organization')
+        content_views = module.find_content_views(module.foreman_params['content_views'], scope)
+        environments = module.lookup_entity('lifecycle_environments') or []
+
+        outcomes = {}
+        for content_view in content_views:
+            outcomes[content_view['id']] = {
+                'id': content_view['id'],
+                'name': content_view['name'],
+                'composite': content_view['composite'],
+                'content_view_version_id': None,
+                'publish': None,
+                'promotions': [],
+            }
+
+        stages, dependencies = publish_stages(content_views)
+        failed_views = set()
+        for stage in stages:
+            # composites of failed content views would pick up the old versions of their components
+            stage = [content_view for content_view in stage if not dependencies[content_view['id']] & failed_views]
+            actions = []
+            for content_view in stage:
+                payload = {
+                    'id': content_view['id'],
+                    'force_yum_metadata_regeneration': module.foreman_params['force_yum_metadata_regeneration'],
+                }
+                if 'description' in module.foreman_params:
+                    payload['description'] = module.foreman_params['description']
+                actions.append(('content_views', 'publish', payload))
+            for content_view, finished in zip(stage, module.run_tasks(actions, module.foreman_params['concurrency'])):
+                outcome = outcomes[content_view['id']]
+                outcome['publish'] = task_outcome(finished)
+                task = finished['task']
+                if task is None:
+                    continue
+                if task['result'] != 'success':
+                    failed_views.add(content_view['id'])
+                    continue
+                # workaround for https://projects.theforeman.org/issues/28138
+                outcome['content_view_version_id'] = task['output'].get('content_view_version_id') or task['input'].get('content_view_version_id')
+
+        failed_versions = set()
+        published = [outcome for outcome in outcomes.values() if outcome['content_view_version_id']]
+        for stage in promotion_stages(module, environments, scope) if published else []:
+            # promoting locks the content view, so every version is promoted to all environments of a stage with one task
+            stage_environments = [environment for environment in stage if environment['name'] != 'Library']
+            promotions = [outcome for outcome in published if outcome['content_view_version_id'] not in failed_versions] if stage_environments else []
+            actions = [('content_view_versions', 'promote', {
+                'id': outcome['content_view_version_id'],
+                'environment_ids': [environment['id'] for environment in stage_environments],
+                'force': module.foreman_params['force_promote'],
+                'force_yum_metadata_regeneration': module.foreman_params['force_yum_metadata_regeneration'],
+            }) for outcome in promotions]
+            for outcome, finished in zip(promotions, module.run_tasks(actions, module.foreman_params['concurrency'])):
+                promotion = task_outcome(finished)
+                promotion['lifecycle_environments'] = [environment['name'] for environment in stage_environments]
+                outcome['promotions'].append(promotion)
+                if promotion['result'] != 'success':
+                    # the next environments of the path require this one
+                    failed_versions.add(outcome['content_view_version_id'])
+
+        results = [outcomes[content_view['id']] for content_view in content_views]
+        unsuccessful = [outcome['name'] for outcome in results
+                        if outcome['id'] in failed_views or outcome['content_view_version_id'] in failed_versions
+                        or (outcome['publish'] is None and not module.check_mode)]
+        if unsuccessful:
+            module.fail_json(msg="Failed to publish or promote content views: {0}".format(', '.join(unsuccessful)), content_views=results)
+        module.exit_json(content_views=results)
+
+
+if __name__ == '__main__':
+    main()
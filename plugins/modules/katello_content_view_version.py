@@ -69,6 +69,19 @@ options:
       - The lifecycle environment that is already associated with the content view version
       - Helpful for promoting a content view version
     type: str
+  publish_if_changed:
+    description:
+      - Only publish a new version when the repositories or filters of the content view changed since the latest version was published
+      - They changed when a repository was added, removed or synced,
+        or a filter or filter rule was added, modified or removed after the latest version was published
+      - The filters and filter rules a version is published with are recorded in C(~/.cache/foreman-ansible-modules) (or below C($XDG_CACHE_HOME))
+        of the host running the module. When they are not recorded for the latest version, e.g. because it was published on another host,
+        a new version is published.
+      - When nothing changed, the latest version is promoted to I(lifecycle_environments) instead
+      - Composite Content Views are always published
+      - Only used when neither I(version) nor I(current_lifecycle_environment) are given
+    type: bool
+    default: false
 extends_documentation_fragment:
   - foreman
   - foreman.entity_state
@@ -118,6 +131,18 @@ EXAMPLES = '''
       - Library
       - Dev
 
+- name: "Publish a content view only when its repositories changed and make sure the latest version is in Dev"
+  katello_content_view_version:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    content_view: "CV 1"
+    organization: "Default Organization"
+    publish_if_changed: true
+    lifecycle_environments:
+      - Library
+      - Dev
+
 - name: "Ensure content view version 1.0 doesn't exist"
   katello_content_view_version:
     username: "admin"
@@ -132,7 +157,58 @@ EXAMPLES = '''
 RETURN = ''' # '''
 
 
-from ansible.module_utils.foreman_helper import KatelloEntityAnsibleModule
+from ansible.module_utils.foreman_helper import KatelloEntityAnsibleModule, load_json_file, parse_timestamp, save_json_file
+
+
+def repository_key(repository):
+    # archived copies in a content view version keep the product and label of their library repository
+    return (repository['product']['id'], repository['label'])
+
+
+def filter_rule_ids(content_view_filters):
+    """Return the ids of the filters and of their rules, to notice removed filters and rules"""
+    return sorted([content_view_filter['id'], sorted(rule['id'] for rule in content_view_filter.get('rules', []))]
+                  for content_view_filter in content_view_filters)
+
+
+def content_view_changed(module, content_view, latest_version, content_view_filters, scope):
+    """Tell whether the repositories or the filters of the content view changed since the latest version was published
+
+    The archived repositories of a version only hold the content that passed the filters,
+    so their content counts are no measure of change, the sync and modification times are.
+    Removed filters and rules leave no modification time behind, they are found by comparing
+    the filters and rules with the ones recorded when the latest version was published.
+    """
+    with module.locked_cache_file('content_view_filters', [content_view['id'], latest_version['version']]) as filters_file_name:
+        published_filters = load_json_file(filters_file_name)
+    if published_filters != filter_rule_ids(content_view_filters):
+        return True
+
+    published_repositories = module.list_resource('repositories', params=dict(scope, content_view_version_id=latest_version['id'], archived=True))
+    current_repositories = module.list_resource('repositories', params=dict(scope, content_view_id=content_view['id']))
+    if set(map(repository_key, published_repositories)) != set(map(repository_key, current_repositories)):
+        return True
+
+    published_at = parse_timestamp(latest_version['published'])
+
+    def changed_after_publish(timestamp):
+        return bool(timestamp) and parse_timestamp(timestamp) > published_at
+
+    for repository in current_repositories:
+        if changed_after_publish((repository.get('last_sync') or {}).get('ended_at')):
+            return True
+    for content_view_filter in content_view_filters:
+        if changed_after_publish(content_view_filter.get('updated_at')):
+            return True
+        if any(changed_after_publish(rule.get('updated_at')) for rule in content_view_filter.get('rules', [])):
+            return True
+    return False
+
+
+def record_filters(module, content_view, content_view_filters):
+    """Record the filters and rules of the content view for the version it publishes next"""
+    with module.locked_cache_file('content_view_filters', [content_view['id'], content_view['next_version']]) as filters_file_name:
+        save_json_file(filters_file_name, filter_rule_ids(content_view_filters))
 
 
 def promote_content_view_version(module, content_view_version, environments, force, force_yum_metadata_regeneration):
@@ -168,6 +244,7 @@ def main():
             force_promote=dict(type='bool', aliases=['force'], default=False),
             force_yum_metadata_regeneration=dict(type='bool', default=False),
             current_lifecycle_environment=dict(type='entity', resource_type='lifecycle_environments', scope=['organization']),
+            publish_if_changed=dict(type='bool', default=False),
         ),
         mutually_exclusive=[['current_lifecycle_environment', 'version']],
         entity_resolve=False,
@@ -178,6 +255,8 @@ def main():
     with module.api_connection():
         scope = module.scope_for('organization')
         content_view = module.lookup_entity('content_view')
+        # only recorded for publish_if_changed
+        content_view_filters = None
 
         if 'current_lifecycle_environment' in module.foreman_params:
             search_scope = {'content_view_id': content_view['id'], 'environment_id': module.lookup_entity('current_lifecycle_environment')['id']}
@@ -185,6 +264,16 @@ def main():
         elif 'version' in module.foreman_params:
             search = "content_view_id={0},version={1}".format(content_view['id'], module.foreman_params['version'])
             content_view_version = module.find_resource('content_view_versions', search=search, failsafe=True)
+        elif module.foreman_params['publish_if_changed']:
+            content_view_version = None
+            content_view = module.show_resource('content_views', content_view['id'])
+            if not content_view['composite']:
+                # the filters come with their rules
+                content_view_filters = module.list_resource('content_view_filters', params={'content_view_id': content_view['id']})
+                if content_view['versions']:
+                    latest_version = max(content_view['versions'], key=lambda version: version['id'])
+                    if not content_view_changed(module, content_view, latest_version, content_view_filters, scope):
+                        content_view_version = module.show_resource('content_view_versions', latest_version['id'])
         else:
             content_view_version = None
         module.set_entity('entity', content_view_version)
@@ -207,6 +296,9 @@ def main():
                     payload['minor'] = split_version[1]
 
                 response = module.resource_action('content_views', 'publish', params=payload)
+                if content_view_filters is not None:
+                    # also in check mode, so later tasks of the run see the filters of the version it pretends to publish
+                    record_filters(module, content_view, content_view_filters)
                 # workaround for https://projects.theforeman.org/issues/28138
                 if not module.check_mode:
                     content_view_version_id = response['output'].get('content_view_version_id') or response['input'].get('content_view_version_id')
@@ -0,0 +1,194 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# (c) 2020, The Foreman Project
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: katello_content_view_version_cleanup
+short_description: Remove old Katello Content View Versions
+description:
+  - Remove all but the newest Content View Versions of Katello Content Views
+  - Versions that are promoted to a Lifecycle Environment or used by a Composite Content View are never removed
+  - Versions of different Content Views are removed concurrently and all removal tasks are tracked together
+  - Run in check mode to only report the versions that would be removed
+author: "The Foreman Project (@theforeman)"
+options:
+  content_views:
+    description:
+      - Names of the Content Views to clean up
+      - When omitted, all Content Views of the organization except the Default Organization View are cleaned up
+    type: list
+    elements: str
+  keep:
+    description:
+      - Number of the newest versions of every Content View that are kept
+    required: true
+    type: int
+  concurrency:
+    description:
+      - Number of removal tasks running at the same time
+    default: 4
+    type: int
+extends_documentation_fragment:
+  - foreman
+  - foreman.organization
+'''
+
+EXAMPLES = '''
+- name: "Keep the three newest versions of all content views"
+  katello_content_view_version_cleanup:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    organization: "Default Organization"
+    keep: 3
+
+- name: "Show which versions of CV 1 would be removed"
+  katello_content_view_version_cleanup:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    organization: "Default Organization"
+    content_views:
+      - "CV 1"
+    keep: 1
+  check_mode: true
+  register: cleanup
+'''
+
+RETURN = '''
+content_view_versions:
+  description: Content View Versions that were removed, or would be removed in check mode
+  returned: always
+  type: list
+  elements: dict
+  contains:
+    id:
+      description: Id of the Content View Version
+      type: int
+    content_view:
+      description: Name of the Content View
+      type: str
+    version:
+      description: Version number of the Content View Version
+      type: str
+    task_id:
+      description: Id of the removal task
+      type: str
+    result:
+      description: Result of the removal task
+      type: str
+    duration:
+      description: Duration of the removal task in seconds
+      type: int
+'''
+
+
+from ansible.module_utils.foreman_helper import KatelloAnsibleModule
+
+
+def find_content_views(module, names, scope):
+    if names is None:
+        return [content_view for content_view in module.list_resource('content_views', params=scope) if not content_view['default']]
+    return module.find_content_views(names, scope)
+
+
+def is_in_use(content_view_version):
+    return bool(content_view_version.get('environments') or content_view_version.get('composite_content_view_ids')
+                or content_view_version.get('published_in_composite_content_view_ids'))
+
+
+def removable_versions(content_view_versions, keep):
+    """Return the versions that are neither among the keep newest of their content view nor in use"""
+    by_content_view = {}
+    for content_view_version in content_view_versions:
+        by_content_view.setdefault(content_view_version['content_view_id'], []).append(content_view_version)
+    removable = []
+    for versions in by_content_view.values():
+        versions.sort(key=lambda content_view_version: content_view_version['id'], reverse=True)
+        removable.extend(content_view_version for content_view_version in versions[keep:] if not is_in_use(content_view_version))
+    return sorted(removable, key=lambda content_view_version: content_view_version['id'])
+
+
+def removal_rounds(content_view_versions):
+    """Split the versions into rounds with at most one version of every content view
+
+    Removing a version locks its content view, so only versions of different content views can be removed at the same time.
+    """
+    rounds = []
+    seen = {}
+    for content_view_version in content_view_versions:
+        position = seen.get(content_view_version['content_view_id'], 0)
+        seen[content_view_version['content_view_id']] = position + 1
+        if position == len(rounds):
+            rounds.append([])
+        rounds[position].append(content_view_version)
+    return rounds
+
+
+def main():
+    module = KatelloAnsibleModule(
+        foreman_spec=dict(
+            content_views=dict(type='list', elements='str'),
+            keep=dict(type='int', required=True),
+            concurrency=dict(type='int', default=4),
+        ),
+    )
+
+    if module.foreman_params['keep'] < 0:
+        module.fail_json(msg="keep must not be negative")
+
+    module.task_timeout = 60 * 60
+
+    with module.api_connection():
+        scope = module.scope_for('organization')
+        content_views = find_content_views(module, module.foreman_params.get('content_views'), scope)
+        names = {content_view['id']: content_view['name'] for content_view in content_views}
+
+        searches = ['content_view_id = {0}'.format(content_view['id']) for content_view in content_views]
+        content_view_versions = module.list_resource_by_searches('content_view_versions', searches, params=scope)
+        removable = removable_versions(content_view_versions, module.foreman_params['keep'])
+
+        results = []
+        for removal_round in removal_rounds(removable):
+            actions = [('content_view_versions', 'destroy', {'id': content_view_version['id']}) for content_view_version in removal_round]
+            for content_view_version, finished in zip(removal_round, module.run_tasks(actions, module.foreman_params['concurrency'])):
+                task = finished['task'] or {}
+                results.append({
+                    'id': content_view_version['id'],
+                    'content_view': names[content_view_version['content_view_id']],
+                    'version': content_view_version['version'],
+                    'task_id': task.get('id'),
+                    'result': task.get('result'),
+                    'duration': finished['duration'],
+                })
+
+        failed = ['{0} {1}'.format(result['content_view'], result['version']) for result in results if result['task_id'] and result['result'] != 'success']
+        if failed:
+            module.fail_json(msg="Failed to remove content view versions: {0}".format(', '.join(failed)), content_view_versions=results)
+        module.exit_json(content_view_versions=results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# (c) 2020, The Foreman Project
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: katello_content_view_version_export
+short_description: Export Katello Content View Versions
+description:
+  - Export a Katello Content View Version for a disconnected Katello server
+  - Katello writes the export to its export directory,
+    the module can copy it from there together with a metadata file for M(katello_content_view_version_import)
+author: "The Foreman Project (@theforeman)"
+notes:
+  - Every run starts a new export, this module is not idempotent.
+  - I(destination) requires the module to run on the Katello server, e.g. with C(delegate_to).
+options:
+  content_view:
+    description:
+      - Name of the Content View
+    required: true
+    type: str
+  version:
+    description:
+      - Version of the Content View to export, the latest version by default
+    type: str
+  since:
+    description:
+      - Only export content added after this date, e.g. C(2020-01-01T12:00:00Z)
+    type: str
+  incremental:
+    description:
+      - Only export content added after the previous version of the Content View was published
+      - Use this when the previous version was exported already.
+    type: bool
+    default: false
+  export_to_iso:
+    description:
+      - Export to ISO images instead of a directory
+    type: bool
+    default: false
+  iso_mb_size:
+    description:
+      - Maximum size of each ISO image in MB
+    type: int
+  export_directory:
+    description:
+      - Directory Katello writes exports to, the C(pulp_export_destination) setting
+    type: path
+    default: /var/lib/pulp/katello-export
+  destination:
+    description:
+      - Directory to copy the export and its metadata file to
+    type: path
+  concurrency:
+    description:
+      - Number of files copied at the same time
+    type: int
+    default: 4
+extends_documentation_fragment:
+  - foreman
+  - foreman.organization
+'''
+
+EXAMPLES = '''
+- name: "Export the changes since version 2.0 of RHEL 7 to the transfer disk"
+  katello_content_view_version_export:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    organization: "Default Organization"
+    content_view: "RHEL 7"
+    version: "3.0"
+    incremental: true
+    destination: /mnt/transfer
+  delegate_to: foreman.example.com
+'''
+
+RETURN = '''
+content_view_version:
+  description: Id and version of the exported Content View Version
+  returned: always
+  type: dict
+since:
+  description: Date the export is incremental from
+  returned: always
+  type: str
+export_name:
+  description: Name of the export in the export directory
+  returned: always
+  type: str
+metadata:
+  description: Path of the metadata file written to the destination
+  returned: when I(destination) is set and not in check mode
+  type: str
+files:
+  description: Files copied to the destination with their SHA-256 checksums
+  returned: when I(destination) is set and not in check mode
+  type: dict
+'''
+
+import json
+import os
+import time
+
+from ansible.module_utils.foreman_helper import KatelloAnsibleModule, copy_file, list_files, parse_timestamp
+
+
+def find_content_view_version(module, content_view):
+    versions = sorted(content_view['versions'], key=lambda version: version['id'])
+    if 'version' in module.foreman_params:
+        versions_before = []
+        for version in versions:
+            if version['version'] == module.foreman_params['version']:
+                return version, versions_before
+            versions_before.append(version)
+        module.fail_json(msg="Could not find version {0} of content view {1}".format(module.foreman_params['version'], content_view['name']))
+    if not versions:
+        module.fail_json(msg="Content view {0} has no versions".format(content_view['name']))
+    return versions[-1], versions[:-1]
+
+
+def export_files(module, export_name):
+    """Find the files of the export, a directory or ISO images named after it"""
+    export_directory = module.foreman_params['export_directory']
+    try:
+        entries = [entry for entry in os.listdir(export_directory) if entry == export_name or entry.startswith(export_name + '-')]
+    except OSError as e:
+        module.fail_json(msg="Could not read the export directory {0}: {1}".format(export_directory, e))
+    files = []
+    for entry in sorted(entries):
+        if os.path.isdir(os.path.join(export_directory, entry)):
+            files.extend(os.path.join(entry, file_name) for file_name in list_files(os.path.join(export_directory, entry)))
+        else:
+            files.append(entry)
+    if not files:
+        module.fail_json(msg="Could not find the export {0} in {1}".format(export_name, export_directory))
+    return files
+
+
+def main():
+    module = KatelloAnsibleModule(
+        foreman_spec=dict(
+            organization=dict(type='entity', required=True, thin=False),
+            content_view=dict(type='entity', required=True, scope=['organization']),
+            version=dict(),
+            since=dict(),
+            incremental=dict(type='bool', default=False),
+            export_to_iso=dict(type='bool', default=False),
+            iso_mb_size=dict(type='int'),
+            export_directory=dict(type='path', default='/var/lib/pulp/katello-export'),
+            destination=dict(type='path'),
+            concurrency=dict(type='int', default=4),
+        ),
+    )
+
+    if module.foreman_params['incremental'] and 'since' in module.foreman_params:
+        module.fail_json(msg="since and incremental are mutually exclusive")
+
+    module.task_timeout = 60 * 60
+
+    with module.api_connection():
+        organization = module.lookup_entity('organization')
+        content_view = module.show_resource('content_views', module.lookup_entity('content_view')['id'])
+        content_view_version, versions_before = find_content_view_version(module, content_view)
+
+        since = module.foreman_params.get('since')
+        if module.foreman_params['incremental'] and versions_before:
+            published = parse_timestamp(versions_before[-1]['published'])
+            since = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(published))
+
+        payload = {
+            'id': content_view_version['id'],
+            'export_to_iso': module.foreman_params['export_to_iso'],
+        }
+        if since:
+            payload['since'] = since
+        if 'iso_mb_size' in module.foreman_params:
+            payload['iso_mb_size'] = module.foreman_params['iso_mb_size']
+        module.resource_action('content_view_versions', 'export', payload)
+
+        export_name = '{0}-{1}-v{2}'.format(organization['label'], content_view['label'], content_view_version['version'])
+        result = {
+            'content_view_version': {'id': content_view_version['id'], 'version': content_view_version['version']},
+            'since': since,
+            'export_name': export_name,
+        }
+
+        if 'destination' in module.foreman_params and not module.check_mode:
+            destination = module.foreman_params['destination']
+            files = export_files(module, export_name)
+            checksums = module.concurrent_map(
+                lambda file_name: copy_file(os.path.join(module.foreman_params['export_directory'], file_name), os.path.join(destination, file_name)),
+                files, module.foreman_params['concurrency'])
+            result['files'] = dict(zip(files, checksums))
+
+            repositories = module.list_resource('repositories', params={
+                'organization_id': organization['id'],
+                'content_view_version_id': content_view_version['id'],
+                'archived': True,
+            })
+            metadata = {
+                'organization': organization['label'],
+                'content_view': content_view['name'],
+                'version': content_view_version['version'],
+                'since': since,
+                'export_to_iso': module.foreman_params['export_to_iso'],
+                'repositories': [{
+                    'name': repository['name'],
+                    'label': repository['label'],
+                    'product': repository['product']['name'],
+                    'content_type': repository['content_type'],
+                    'relative_path': repository['relative_path'],
+                } for repository in repositories],
+                'files': result['files'],
+            }
+            result['metadata'] = os.path.join(destination, export_name + '.json')
+            with open(result['metadata'], 'w') as metadata_file:
+                json.dump(metadata, metadata_file, indent=2, sort_keys=True)
+
+        module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# (c) 2020, The Foreman Project
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: katello_content_view_version_import
+short_description: Import Katello Content View Versions
+description:
+  - Import a Katello Content View Version exported with M(katello_content_view_version_export) on a disconnected Katello server
+  - The files of the export are verified against the checksums in the metadata file,
+    the repositories of the Content View are synced from the export and the Content View is published with the exported version
+  - Incremental exports are imported with incremental syncs, which keep the content the repositories have already
+  - The Content View and its repositories have to exist already, repositories are matched by product name and label
+author: "The Foreman Project (@theforeman)"
+notes:
+  - Exports to ISO images have to be extracted to I(path) first.
+options:
+  content_view:
+    description:
+      - Name of the Content View
+    required: true
+    type: str
+  path:
+    description:
+      - Directory containing the export
+    required: true
+    type: path
+  metadata:
+    description:
+      - Metadata file of the export, the only C(.json) file in I(path) by default
+    type: path
+  source_url:
+    description:
+      - URL the Katello server reaches I(path) at
+      - Defaults to a C(file://) URL of I(path), which requires the module to run on the Katello server.
+    type: str
+  verify_checksums:
+    description:
+      - Verify the files of the export against the checksums in the metadata file
+    type: bool
+    default: true
+  description:
+    description:
+      - Description of the imported Content View Version
+    type: str
+  concurrency:
+    description:
+      - Number of files verified and repositories synced at the same time
+    type: int
+    default: 4
+extends_documentation_fragment:
+  - foreman
+  - foreman.organization
+'''
+
+EXAMPLES = '''
+- name: "Import version 3.0 of RHEL 7 from the transfer disk"
+  katello_content_view_version_import:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    organization: "Default Organization"
+    content_view: "RHEL 7"
+    path: /mnt/transfer
+  delegate_to: foreman.example.com
+'''
+
+RETURN = '''
+content_view_version:
+  description: Id and version of the imported Content View Version
+  returned: success and not in check mode
+  type: dict
+repositories:
+  description: Name, product, sync task id and result of every synced repository
+  returned: always
+  type: list
+  elements: dict
+'''
+
+import json
+import os
+
+from ansible.module_utils.foreman_helper import KatelloAnsibleModule, file_checksum
+
+
+def load_metadata(module):
+    metadata_path = module.foreman_params.get('metadata')
+    if metadata_path is None:
+        try:
+            candidates = [entry for entry in os.listdir(module.foreman_params['path']) if entry.endswith('.json')]
+        except OSError as e:
+            module.fail_json(msg="Could not read the export directory {0}: {1}".format(module.foreman_params['path'], e))
+        if len(candidates) != 1:
+            module.fail_json(msg="Expected exactly one metadata file in {0}, found {1}".format(module.foreman_params['path'], len(candidates)))
+        metadata_path = os.path.join(module.foreman_params['path'], candidates[0])
+    try:
+        with open(metadata_path) as metadata_file:
+            return json.load(metadata_file)
+    except (IOError, ValueError) as e:
+        module.fail_json(msg="Could not read the metadata file {0}: {1}".format(metadata_path, e))
+
+
+def verify_files(module, files):
+    def checksum(file_name):
+        file_path = os.path.join(module.foreman_params['path'], file_name)
+        return file_checksum(file_path) if os.path.isfile(file_path) else None
+
+    file_names = sorted(files)
+    checksums = module.concurrent_map(checksum, file_names, module.foreman_params['concurrency'])
+    damaged = [file_name for file_name, actual in zip(file_names, checksums) if actual != files[file_name]]
+    if damaged:
+        module.fail_json(msg="The export is incomplete or damaged: {0}".format(', '.join(damaged)))
+
+
+def repository_directories(module, repositories):
+    """Find the directory of every exported repository below path, by the end of its relative path"""
+    directories = {}
+    for directory, _subdirectories, _file_names in os.walk(module.foreman_params['path']):
+        for repository in repositories:
+            if directory.rstrip('/').endswith('/' + repository['relative_path'].strip('/')):
+                directories.setdefault(repository['relative_path'], os.path.relpath(directory, module.foreman_params['path']))
+    missing = [repository['name'] for repository in repositories if repository['relative_path'] not in directories]
+    if missing:
+        module.fail_json(msg="Could not find the exported repositories {0} in {1}".format(', '.join(missing), module.foreman_params['path']))
+    return directories
+
+
+def main():
+    module = KatelloAnsibleModule(
+        foreman_spec=dict(
+            content_view=dict(type='entity', required=True, scope=['organization']),
+            path=dict(type='path', required=True),
+            metadata=dict(type='path'),
+            source_url=dict(),
+            verify_checksums=dict(type='bool', default=True),
+            description=dict(),
+            concurrency=dict(type='int', default=4),
+        ),
+    )
+
+    module.task_timeout = 60 * 60
+
+    metadata = load_metadata(module)
+    source_url = module.foreman_params.get('source_url') or 'file://' + module.foreman_params['path']
+
+    with module.api_connection():
+        scope = module.scope_for('organization')
+        content_view = module.show_resource('content_views', module.lookup_entity('content_view')['id'])
+        for version in content_view['versions']:
+            if version['version'] == metadata['version']:
+                # imported already
+                module.exit_json(content_view_version={'id': version['id'], 'version': version['version']}, repositories=[])
+
+        if module.foreman_params['verify_checksums']:
+            verify_files(module, metadata['files'])
+        directories = repository_directories(module, metadata['repositories'])
+
+        repositories = {(repository['product']['name'], repository['label']): repository
+                        for repository in module.list_resource('repositories', params=dict(scope, content_view_id=content_view['id']))}
+        missing = [exported['name'] for exported in metadata['repositories'] if (exported['product'], exported['label']) not in repositories]
+        if missing:
+            module.fail_json(msg="Content view {0} is missing the repositories {1}".format(content_view['name'], ', '.join(missing)))
+
+        actions = []
+        for exported in metadata['repositories']:
+            payload = {
+                'id': repositories[(exported['product'], exported['label'])]['id'],
+                'source_url': '/'.join([source_url.rstrip('/'), directories[exported['relative_path']]]),
+            }
+            if metadata.get('since'):
+                # a mirroring sync from an export of only the newer content would remove all older content
+                payload['incremental'] = True
+            actions.append(('repositories', 'sync', payload))
+        results = []
+        for exported, finished in zip(metadata['repositories'], module.run_tasks(actions, module.foreman_params['concurrency'])):
+            task = finished['task'] or {}
+            results.append({'name': exported['name'], 'product': exported['product'], 'task_id': task.get('id'), 'result': task.get('result')})
+        failed = [result['name'] for result in results if result['task_id'] and result['result'] != 'success']
+        if failed:
+            module.fail_json(msg="Failed to sync the repositories {0} from the export".format(', '.join(failed)), repositories=results)
+
+        major, minor = str(metadata['version']).split('.')
+        payload = {
+            'id': content_view['id'],
+            'major': int(major),
+            'minor': int(minor),
+        }
+        if 'description' in module.foreman_params:
+            payload['description'] = module.foreman_params['description']
+        response = module.resource_action('content_views', 'publish', payload)
+        result = {'repositories': results}
+        if not module.check_mode:
+            # workaround for https://projects.theforeman.org/issues/28138
+            content_view_version_id = response['output'].get('content_view_version_id') or response['input'].get('content_view_version_id')
+            result['content_view_version'] = {'id': content_view_version_id, 'version': metadata['version']}
+        module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
@@ -47,6 +47,20 @@ options:
     description:
       - New name of the host collection. When this parameter is set, the module will not be idempotent.
     type: str
+  hosts:
+    description:
+      - Names of the hosts in the host collection
+    type: list
+    elements: str
+  hosts_state:
+    description:
+      - Whether the I(hosts) are added to the host collection, removed from it or exactly the hosts of the host collection
+    choices:
+      - present
+      - absent
+      - exact
+    default: exact
+    type: str
 extends_documentation_fragment:
   - foreman
   - foreman.entity_state
@@ -63,21 +77,84 @@ EXAMPLES = '''
     description: "Foo host collection for Foo servers"
     organization: "My Cool new Organization"
     state: present
+
+- name: "Add the web servers to the Foo host collection"
+  katello_host_collection:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    name: "Foo"
+    organization: "My Cool new Organization"
+    hosts: "{{ groups['webservers'] }}"
+    hosts_state: present
+    state: present
 '''
 
 RETURN = ''' # '''
 
-from ansible.module_utils.foreman_helper import KatelloEntityAnsibleModule
+from ansible.module_utils.foreman_helper import KatelloEntityAnsibleModule, SEARCH_BATCH_SIZE
+
+# above this many hosts, listing all hosts of the organization once is faster than searching for them
+HOSTS_SEARCH_LIMIT = 5 * SEARCH_BATCH_SIZE
+HOSTS_BATCH_SIZE = 1000
 
 
 class KatelloHostCollectionModule(KatelloEntityAnsibleModule):
     pass
 
 
+def find_host_ids(module, names, scope):
+    params = dict(scope, thin=True)
+    if len(names) > HOSTS_SEARCH_LIMIT:
+        hosts = module.list_resource('hosts', params=params)
+    else:
+        hosts = module.list_resource_by_searches('hosts', ['name="{0}"'.format(name) for name in names], params=params)
+    host_ids = {host['name']: host['id'] for host in hosts}
+    missing = [name for name in names if name not in host_ids]
+    if missing and module.foreman_params['hosts_state'] != 'absent':
+        module.fail_json(msg="Could not find hosts: {0}".format(', '.join(missing)))
+    return set(host_ids[name] for name in names if name in host_ids)
+
+
+def ensure_hosts(module, host_collection, scope):
+    if host_collection['id'] == -1:
+        # a new host collection in check mode
+        current_host_ids = set()
+    elif 'host_ids' in host_collection:
+        current_host_ids = set(host_collection['host_ids'])
+    else:
+        current_host_ids = set(module.show_resource('host_collections', host_collection['id'])['host_ids'])
+    host_ids = find_host_ids(module, module.foreman_params['hosts'], scope)
+
+    hosts_state = module.foreman_params['hosts_state']
+    if hosts_state == 'absent':
+        desired_host_ids = current_host_ids - host_ids
+    elif hosts_state == 'present':
+        desired_host_ids = current_host_ids | host_ids
+    else:
+        desired_host_ids = host_ids
+
+    if desired_host_ids != current_host_ids:
+        module.record_before('host_collections/hosts', {'id': host_collection.get('id'), 'host_ids': sorted(current_host_ids)})
+        module.record_after('host_collections/hosts', {'id': host_collection.get('id'), 'host_ids': sorted(desired_host_ids)})
+        module.record_after_full('host_collections/hosts', {'id': host_collection.get('id'), 'host_ids': sorted(desired_host_ids)})
+
+        for action, ids in (('remove_hosts', current_host_ids - desired_host_ids), ('add_hosts', desired_host_ids - current_host_ids)):
+            ids = sorted(ids)
+            for start in range(0, len(ids), HOSTS_BATCH_SIZE):
+                payload = {
+                    'id': host_collection.get('id'),
+                    'host_ids': ids[start:start + HOSTS_BATCH_SIZE],
+                }
+                module.resource_action('host_collections', action, payload)
+
+
 def main():
     module = KatelloHostCollectionModule(
         argument_spec=dict(
             updated_name=dict(),
+            hosts=dict(type='list', elements='str'),
+            hosts_state=dict(choices=['present', 'absent', 'exact'], default='exact'),
         ),
         foreman_spec=dict(
             name=dict(required=True),
@@ -86,7 +163,9 @@ def main():
     )
 
     with module.api_connection():
-        module.run()
+        host_collection = module.run()
+        if not module.desired_absent and 'hosts' in module.foreman_params:
+            ensure_hosts(module, host_collection, module.scope_for('organization'))
 
 
 if __name__ == '__main__':
@@ -68,7 +68,43 @@ EXAMPLES = '''
 
 RETURN = ''' # '''
 
-from ansible.module_utils.foreman_helper import KatelloEntityAnsibleModule
+import json
+import os
+import tempfile
+
+from ansible.module_utils.foreman_helper import KatelloEntityAnsibleModule, manifest_identity, parse_timestamp
+
+
+def read_imported_manifest(module, organization):
+    """Return what was recorded about the last manifest this module imported into the organization"""
+    try:
+        with open(module.cache_file('manifest', organization['id'])) as record_file:
+            return json.load(record_file)
+    except (IOError, ValueError):
+        return None
+
+
+def write_imported_manifest(module, organization, checksum, updated):
+    record_file_name = module.cache_file('manifest', organization['id'])
+    fd, tmp_file_name = tempfile.mkstemp(dir=os.path.dirname(record_file_name))
+    with os.fdopen(fd, 'w') as record_file:
+        json.dump({'checksum': checksum, 'updated': updated}, record_file)
+    os.rename(tmp_file_name, record_file_name)
+
+
+def manifest_is_imported(path, checksum, existing_manifest, imported_manifest):
+    """Check whether the local manifest is the imported one
+
+    The upstream consumer of the organization only tells when a manifest of the consumer was imported, not which one,
+    so the checksum of the last manifest imported by this module and the import time seen afterwards are recorded.
+    Any other manifest, e.g. an older one, is uploaded and judged by the server.
+    """
+    identity = manifest_identity(path)
+    if identity is None or not existing_manifest or not existing_manifest.get('updated') or not imported_manifest:
+        return False
+    uuid, created = identity
+    return (uuid == existing_manifest['uuid'] and created <= parse_timestamp(existing_manifest['updated'])
+            and imported_manifest['checksum'] == checksum and imported_manifest['updated'] in (None, existing_manifest['updated']))
 
 
 def main():
@@ -104,6 +140,14 @@ def main():
                 org_spec = dict(id=dict(), redhat_repository_url=dict())
                 organization = module.ensure_entity('organizations', payload, organization, state='present', foreman_spec=org_spec)
 
+            checksum = module.sha256(module.foreman_params['manifest_path'])
+            imported_manifest = read_imported_manifest(module, organization)
+            if manifest_is_imported(module.foreman_params['manifest_path'], checksum, existing_manifest, imported_manifest):
+                # the manifest was imported already, skip the upload and its task
+                if imported_manifest['updated'] is None:
+                    write_imported_manifest(module, organization, checksum, existing_manifest['updated'])
+                module.exit_json()
+
             try:
                 with open(module.foreman_params['manifest_path'], 'rb') as manifest_file:
                     files = {'content': (module.foreman_params['manifest_path'], manifest_file, 'application/zip')}
@@ -122,6 +166,8 @@ def main():
                             module.fail_json(msg="Upload of the manifest failed: %s" % error)
                     else:
                         module.set_changed()
+                    # the import time is only known after the next lookup of the organization
+                    write_imported_manifest(module, organization, checksum, None)
             except IOError as e:
                 module.fail_json(msg="Unable to read the manifest file: %s" % e)
         elif module.desired_absent and existing_manifest:
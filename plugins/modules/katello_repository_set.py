@@ -70,6 +70,50 @@ options:
       - Required when I(repositories) is unset or an empty list.
     required: false
     type: bool
+  repository_sets:
+    description:
+      - List of repository sets to enable or disable repositories in, instead of a single repository set
+      - All repository sets are found with one search and their available repositories are fetched concurrently.
+    required: false
+    type: list
+    elements: dict
+    suboptions:
+      name:
+        description:
+          - Name of the repository set
+        type: str
+      product:
+        description:
+          - Name of the parent product
+        type: str
+      label:
+        description:
+          - Label of the repository set, can be used in place of I(name) & I(product)
+        type: str
+      repositories:
+        description:
+          - Release version and base architecture of the repositories to enable.
+          - Required when I(all_repositories) is unset or C(false).
+        type: list
+        elements: dict
+        suboptions:
+          basearch:
+            description:
+              - Basearch of the repository to enable.
+            type: str
+          releasever:
+            description:
+              - Releasever of the repository to enable.
+            type: str
+      all_repositories:
+        description:
+          - Affect all available repositories in the repository set instead of listing them in I(repositories).
+        type: bool
+  concurrency:
+    description:
+      - Number of repositories that are enabled or disabled, and of repository sets that are fetched, at the same time
+    default: 4
+    type: int
   state:
     description:
       - Whether the repositories are enabled or not
@@ -165,6 +209,21 @@ EXAMPLES = '''
     all_repositories: true
     state: enabled
 
+- name: "Enable the RHEL 7 Server and Extras RPMs repositories in one go"
+  katello_repository_set:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    organization: "Default Organization"
+    repository_sets:
+      - label: rhel-7-server-rpms
+        repositories:
+          - releasever: "7Server"
+            basearch: "x86_64"
+      - label: rhel-7-server-extras-rpms
+        all_repositories: true
+    state: enabled
+
 - name: "Search for possible repository sets of a product"
   foreman_search_facts:
     username: "admin"
@@ -192,15 +251,36 @@ EXAMPLES = '''
     var: data
 '''
 
-RETURN = ''' # '''
+RETURN = '''
+repository_sets:
+  description: The repositories that were enabled or disabled in every repository set
+  returned: when I(repository_sets) is given
+  type: list
+  elements: dict
+  contains:
+    id:
+      description: Id of the repository set
+      type: int
+    changed:
+      description: Names of the repositories that were enabled or disabled
+      type: list
+      elements: str
+'''
 
 from ansible.module_utils.foreman_helper import KatelloEntityAnsibleModule
 
 
+def substitution_key(substitutions):
+    return tuple(sorted(substitutions.items()))
+
+
 def get_desired_repos(desired_substitutions, available_repos):
+    available_by_substitutions = {}
+    for available in available_repos:
+        available_by_substitutions.setdefault(substitution_key(available['substitutions']), []).append(available)
     desired_repos = []
     for sub in desired_substitutions:
-        desired_repos += filter(lambda available: available['substitutions'] == sub, available_repos)
+        desired_repos += available_by_substitutions.get(substitution_key(sub), [])
     return desired_repos
 
 
@@ -215,6 +295,94 @@ def record_repository_set_state(module, record_data, repo, state_before, state_a
     module.record_after_full('repository_sets', repo_change_data_after)
 
 
+def find_repository_sets(module, wanted_sets, scope):
+    """Find all repository sets with one batched search, by label or by name and optionally product"""
+    searches = []
+    for wanted_set in wanted_sets:
+        if wanted_set.get('label'):
+            searches.append('label="{0}"'.format(wanted_set['label']))
+        elif wanted_set.get('product'):
+            searches.append('name="{0}" and product_name="{1}"'.format(wanted_set['name'], wanted_set['product']))
+        else:
+            searches.append('name="{0}"'.format(wanted_set['name']))
+    found = module.list_resource_by_searches('repository_sets', searches, params=scope)
+
+    repo_sets = []
+    for wanted_set in wanted_sets:
+        if wanted_set.get('label'):
+            matches = [repo_set for repo_set in found if repo_set['label'] == wanted_set['label']]
+        else:
+            matches = [repo_set for repo_set in found if repo_set['name'] == wanted_set['name']
+                       and (not wanted_set.get('product') or repo_set['product']['name'] == wanted_set['product'])]
+        if len(matches) != 1:
+            module.fail_json(msg="Found {0} results while searching for repository set {1}".format(
+                len(matches), wanted_set.get('label') or wanted_set['name']))
+        repo_sets.append(matches[0])
+    return repo_sets
+
+
+def repository_set_scope(repo_set, scope):
+    repo_set_scope = {'id': repo_set['id'], 'product_id': repo_set['product']['id']}
+    repo_set_scope.update(scope)
+    return repo_set_scope
+
+
+def available_repositories(module, repo_set, scope):
+    available_repos = module.resource_action('repository_sets', 'available_repositories', params=repository_set_scope(repo_set, scope),
+                                             ignore_check_mode=True)
+    return available_repos['results']
+
+
+def repository_set_details(module, repo_set, scope):
+    """Return the repository set including its enabled repositories, and its available repositories"""
+    if 'repositories' not in repo_set:
+        repo_set = module.show_resource('repository_sets', repo_set['id'], params={'product_id': repo_set['product']['id']})
+    return repo_set, available_repositories(module, repo_set, scope)
+
+
+def repository_set_changes(module, wanted_set, repo_set, available_repos, record_data, scope):
+    """Return the names and parameters of the repositories of the repository set that have to be enabled or disabled"""
+    repositories = [{k: v for (k, v) in sub.items() if v is not None} for sub in wanted_set.get('repositories') or []]
+    all_repositories = wanted_set.get('all_repositories', False)
+    repo_set_scope = repository_set_scope(repo_set, scope)
+
+    current_repos = repo_set['repositories']
+    if not all_repositories:
+        desired_repos = get_desired_repos(repositories, available_repos)
+    else:
+        desired_repos = available_repos[:]
+
+    current_repo_names = set(map(lambda repo: repo['name'], current_repos))
+    desired_repo_names = set(map(lambda repo: repo['repo_name'], desired_repos))
+
+    if not all_repositories and len(repositories) != len(desired_repo_names):
+        repo_set_identification = ' '.join(['{0}: {1}'.format(k, v) for (k, v) in record_data.items()])
+
+        available_repo_details = [{'name': repo['repo_name'], 'repositories': repo['substitutions']} for repo in available_repos]
+        desired_repo_details = [{'name': repo['repo_name'], 'repositories': repo['substitutions']} for repo in desired_repos]
+        search_details = record_data.copy()
+        search_details['repositories'] = repositories
+
+        error_msg = "Desired repositories are not available on the repository set {0}.\nSearched: {1}\nFound: {2}\nAvailable: {3}".format(
+                    repo_set_identification, search_details, desired_repo_details, available_repo_details)
+
+        module.fail_json(msg=error_msg)
+
+    available_by_name = {repo['repo_name']: repo for repo in available_repos}
+    if module.state == 'enabled':
+        state_before, changed_repo_names = 'disabled', desired_repo_names - current_repo_names
+    else:
+        state_before, changed_repo_names = 'enabled', current_repo_names & desired_repo_names
+
+    changes = []
+    for repo in changed_repo_names:
+        repo_change_params = available_by_name[repo]['substitutions'].copy()
+        repo_change_params.update(repo_set_scope)
+        record_repository_set_state(module, record_data, repo, state_before, module.state)
+        changes.append((repo, repo_change_params))
+    return changes
+
+
 class KatelloRepositorySetModule(KatelloEntityAnsibleModule):
     pass
 
@@ -230,84 +398,83 @@ def main():
                 releasever=dict(),
             )),
             all_repositories=dict(type='bool'),
+            repository_sets=dict(type='list', elements='dict', options=dict(
+                name=dict(),
+                product=dict(),
+                label=dict(),
+                repositories=dict(type='list', elements='dict', options=dict(
+                    basearch=dict(),
+                    releasever=dict(),
+                )),
+                all_repositories=dict(type='bool'),
+            )),
+            concurrency=dict(type='int', default=4),
         ),
         argument_spec=dict(
             state=dict(default='enabled', choices=['disabled', 'enabled']),
         ),
         required_one_of=[
-            ['label', 'name'],
-            ['repositories', 'all_repositories'],
+            ['label', 'name', 'repository_sets'],
+            ['repositories', 'all_repositories', 'repository_sets'],
         ],
+        mutually_exclusive=[['repository_sets', option] for option in ['name', 'label', 'product', 'repositories', 'all_repositories']],
         required_if=[
             ['all_repositories', False, ['repositories']],
             ['repositories', [], ['all_repositories']],
         ],
     )
 
-    repositories = [{k: v for (k, v) in sub.items() if v is not None} for sub in module.foreman_params.get('repositories', [])]
+    for wanted_set in module.foreman_params.get('repository_sets', []):
+        if not wanted_set.get('label') and not wanted_set.get('name'):
+            module.fail_json(msg="Every entry of repository_sets needs a label or a name.")
+        if not wanted_set.get('all_repositories') and not wanted_set.get('repositories'):
+            module.fail_json(msg="Every entry of repository_sets needs repositories or all_repositories.")
+
+    concurrency = module.foreman_params['concurrency']
 
     with module.api_connection():
         scope = module.scope_for('organization')
 
-        record_data = {}
-        if 'product' in module.foreman_params:
-            record_data['product'] = module.foreman_params['product']
-            scope.update(module.scope_for('product'))
-
-        if 'label' in module.foreman_params:
-            search = 'label="{0}"'.format(module.foreman_params['label'])
-            repo_set = module.find_resource('repository_sets', search=search, params=scope)
-            record_data['label'] = module.foreman_params['label']
-        else:
-            repo_set = module.find_resource_by_name('repository_sets', name=module.foreman_params['name'], params=scope)
-            record_data['name'] = module.foreman_params['name']
-        module.set_entity('entity', repo_set)
-
-        repo_set_scope = {'id': repo_set['id'], 'product_id': repo_set['product']['id']}
-        repo_set_scope.update(scope)
-
-        available_repos = module.resource_action('repository_sets', 'available_repositories', params=repo_set_scope, ignore_check_mode=True)
-        available_repos = available_repos['results']
-        current_repos = repo_set['repositories']
-        if not module.foreman_params.get('all_repositories', False):
-            desired_repos = get_desired_repos(repositories, available_repos)
+        if 'repository_sets' in module.foreman_params:
+            wanted_sets = module.foreman_params['repository_sets']
+            details = module.concurrent_map(lambda repo_set: repository_set_details(module, repo_set, scope),
+                                            find_repository_sets(module, wanted_sets, scope), concurrency)
+            repo_sets, available = zip(*details) if wanted_sets else ((), ())
         else:
-            desired_repos = available_repos[:]
-
-        current_repo_names = set(map(lambda repo: repo['name'], current_repos))
-        desired_repo_names = set(map(lambda repo: repo['repo_name'], desired_repos))
-
-        if not module.foreman_params.get('all_repositories', False) and len(repositories) != len(desired_repo_names):
-            repo_set_identification = ' '.join(['{0}: {1}'.format(k, v) for (k, v) in record_data.items()])
-
-            available_repo_details = [{'name': repo['repo_name'], 'repositories': repo['substitutions']} for repo in available_repos]
-            desired_repo_details = [{'name': repo['repo_name'], 'repositories': repo['substitutions']} for repo in desired_repos]
-            search_details = record_data.copy()
-            search_details['repositories'] = repositories
-
-            error_msg = "Desired repositories are not available on the repository set {0}.\nSearched: {1}\nFound: {2}\nAvailable: {3}".format(
-                        repo_set_identification, search_details, desired_repo_details, available_repo_details)
-
-            module.fail_json(msg=error_msg)
-
-        if module.state == 'enabled':
-            for repo in desired_repo_names - current_repo_names:
-                repo_to_enable = next((r for r in available_repos if r['repo_name'] == repo))
-                repo_change_params = repo_to_enable['substitutions'].copy()
-                repo_change_params.update(repo_set_scope)
-
-                record_repository_set_state(module, record_data, repo, 'disabled', 'enabled')
-
-                module.resource_action('repository_sets', 'enable', params=repo_change_params)
-        elif module.state == 'disabled':
-            for repo in current_repo_names & desired_repo_names:
-                repo_to_disable = next((r for r in available_repos if r['repo_name'] == repo))
-                repo_change_params = repo_to_disable['substitutions'].copy()
-                repo_change_params.update(repo_set_scope)
-
-                record_repository_set_state(module, record_data, repo, 'enabled', 'disabled')
-
-                module.resource_action('repository_sets', 'disable', params=repo_change_params)
+            record_data = {}
+            if 'product' in module.foreman_params:
+                record_data['product'] = module.foreman_params['product']
+                scope.update(module.scope_for('product'))
+
+            if 'label' in module.foreman_params:
+                search = 'label="{0}"'.format(module.foreman_params['label'])
+                repo_set = module.find_resource('repository_sets', search=search, params=scope)
+                record_data['label'] = module.foreman_params['label']
+            else:
+                repo_set = module.find_resource_by_name('repository_sets', name=module.foreman_params['name'], params=scope)
+                record_data['name'] = module.foreman_params['name']
+            module.set_entity('entity', repo_set)
+
+            wanted_sets = [dict(record_data, repositories=module.foreman_params.get('repositories'),
+                                all_repositories=module.foreman_params.get('all_repositories'))]
+            repo_sets = [repo_set]
+            available = [available_repositories(module, repo_set, scope)]
+
+        changes = []
+        results = []
+        for wanted_set, repo_set, available_repos in zip(wanted_sets, repo_sets, available):
+            record_data = {key: wanted_set[key] for key in ('product', 'label', 'name') if wanted_set.get(key) is not None}
+            set_changes = repository_set_changes(module, wanted_set, repo_set, available_repos, record_data, scope)
+            changes.extend(set_changes)
+            results.append(dict(record_data, id=repo_set['id'], changed=sorted(repo_name for repo_name, params in set_changes)))
+
+        action = 'enable' if module.state == 'enabled' else 'disable'
+        for _result in module.concurrent_map(lambda change: module.resource_action('repository_sets', action, params=change[1]),
+                                             changes, concurrency):
+            pass
+
+        if 'repository_sets' in module.foreman_params:
+            module.exit_json(repository_sets=results)
 
 
 if __name__ == '__main__':
@@ -35,14 +35,55 @@ author:
   - "Matthias M Dellweg (@mdellweg) ATIX AG"
 options:
   product:
-    description: Product to which the I(repository) lives in
-    required: true
+    description:
+      - Product to which the I(repository) lives in
+      - Required unless I(products) or I(repositories) are given.
     type: str
   repository:
     description: |
       Name of the repository to sync
       If omitted, all repositories in I(product) are synched.
     type: str
+  products:
+    description:
+      - List of products, all repositories with an upstream URL in these products are synced.
+      - Can be combined with I(repositories), but not with I(product).
+    type: list
+    elements: str
+  repositories:
+    description:
+      - List of repositories to sync.
+      - Can be combined with I(products), but not with I(product).
+    type: list
+    elements: dict
+    suboptions:
+      name:
+        description:
+          - Name of the repository
+        type: str
+        required: true
+      product:
+        description:
+          - Product of the repository
+        type: str
+        required: true
+  concurrency:
+    description:
+      - Number of repositories that are synced at the same time, when syncing I(products) or I(repositories).
+      - The module waits for all syncs to finish and fails if any of them failed.
+    default: 4
+    type: int
+  only_if_stale:
+    description:
+      - Only sync repositories that were never synced, whose last sync did not succeed or, if I(max_age) is given, whose last sync is older than that.
+      - The last sync of all repositories is read with few batched requests. Repositories with a sync running are skipped.
+    default: false
+    type: bool
+  max_age:
+    description:
+      - Age in seconds after which the last successful sync of a repository counts as stale.
+      - Implies I(only_if_stale=true).
+    type: int
 extends_documentation_fragment:
   - foreman
   - foreman.organization
@@ -93,34 +134,196 @@ EXAMPLES = '''
   until: async_job_result.finished
   retries: 999
   delay: 10
+
+# Or let the module do it, syncing four repositories at a time
+- name: Sync all repositories of two products and one more repository
+  katello_sync:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    organization: "Default Organization"
+    products:
+      - "CentOS 7"
+      - "EPEL 7"
+    repositories:
+      - name: "Puppet 6"
+        product: "Puppet"
+    concurrency: 4
+
+- name: Sync all repositories of a product that were not synced successfully during the last day
+  katello_sync:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    organization: "Default Organization"
+    product: "CentOS 7"
+    max_age: 86400
+'''
+
+RETURN = '''
+task:
+  description: The sync task, when syncing one I(product) or I(repository)
+  returned: when I(product) is given, unless I(only_if_stale) or I(max_age) are given
+  type: dict
+repositories:
+  description: Outcome of the sync of every repository, when syncing I(products) or I(repositories)
+  returned: when I(products), I(repositories), I(only_if_stale) or I(max_age) are given
+  type: list
+  elements: dict
+  contains:
+    id:
+      description: Id of the repository
+      type: int
+    name:
+      description: Name of the repository
+      type: str
+    product:
+      description: Name of the product of the repository
+      type: str
+    task_id:
+      description: Id of the sync task
+      type: str
+    state:
+      description: Final state of the sync task
+      type: str
+    result:
+      description: Result of the sync task, C(success) if the sync succeeded
+      type: str
+    duration:
+      description: Seconds it took to sync the repository
+      type: int
+    skipped:
+      description: Whether the sync was skipped, because the last sync was recent enough
+      type: bool
 '''
 
-RETURN = ''' # '''
+import time
+
+from ansible.module_utils.foreman_helper import KatelloAnsibleModule, parse_timestamp
+
+
+def is_stale(repository, max_age=None):
+    last_sync = repository.get('last_sync')
+    if not last_sync:
+        return True
+    if last_sync.get('state') not in ('stopped', 'paused'):
+        # a sync is running right now
+        return False
+    if last_sync.get('result') != 'success':
+        return True
+    if max_age is None or not last_sync.get('ended_at'):
+        return False
+    return time.time() - parse_timestamp(last_sync['ended_at']) > max_age
+
+
+def find_sync_repositories(module, product_names, repository_names):
+    """Return all named repositories and all syncable repositories of the named products, without duplicates"""
+    scope = module.scope_for('organization')
+    repositories = []
+    if repository_names:
+        repositories.extend(module.find_repositories(repository_names, params=scope))
+    if product_names:
+        searches = ['name = "{0}"'.format(name) for name in product_names]
+        products = module.list_resource_by_searches('products', searches, params=scope)
+        missing = set(product_names) - set(product['name'] for product in products)
+        if missing:
+            module.fail_json(msg="Could not find products: {0}".format(', '.join(sorted(missing))))
+        searches = ['product_id = {0}'.format(product['id']) for product in products]
+        # syncing a product only syncs its repositories that have an upstream URL
+        repositories.extend(repository for repository in module.list_resource_by_searches('repositories', searches, params=scope)
+                            if repository.get('url'))
+    unique = {}
+    for repository in repositories:
+        unique.setdefault(repository['id'], repository)
+    return list(unique.values())
+
 
-from ansible.module_utils.foreman_helper import KatelloAnsibleModule
+def sync_repositories(module, repositories, skipped=None):
+    actions = [('repositories', 'sync', {'id': repository['id']}) for repository in repositories]
+    outcomes = []
+    for repository, finished in zip(repositories, module.run_tasks(actions, module.foreman_params['concurrency'])):
+        task = finished['task'] or {}
+        outcomes.append({
+            'id': repository['id'],
+            'name': repository['name'],
+            'product': repository['product']['name'],
+            'task_id': task.get('id'),
+            'state': task.get('state'),
+            'result': task.get('result'),
+            'duration': finished['duration'],
+            'skipped': False,
+        })
+    for repository in skipped or []:
+        outcomes.append({
+            'id': repository['id'],
+            'name': repository['name'],
+            'product': repository['product']['name'],
+            'task_id': None,
+            'state': None,
+            'result': None,
+            'duration': 0,
+            'skipped': True,
+        })
+    return outcomes
 
 
 def main():
     module = KatelloAnsibleModule(
         foreman_spec=dict(
-            product=dict(type='entity', scope=['organization'], required=True),
+            product=dict(type='entity', scope=['organization']),
             repository=dict(type='entity', scope=['product'], failsafe=True),
             # This should be scoped more explicit for better serch performance, but needs rerecording
             # repository=dict(type='entity', scope=['organization', 'product'], failsafe=True),
+            products=dict(type='list', elements='str'),
+            repositories=dict(type='list', elements='dict', options=dict(
+                name=dict(required=True),
+                product=dict(required=True),
+            )),
+            concurrency=dict(type='int', default=4),
+            only_if_stale=dict(type='bool', default=False),
+            max_age=dict(type='int'),
         ),
+        required_one_of=[['product', 'products', 'repositories']],
+        mutually_exclusive=[['product', 'products'], ['product', 'repositories']],
     )
 
+    if 'repository' in module.foreman_params and 'product' not in module.foreman_params:
+        module.fail_json(msg="product is required when syncing a repository")
+
     module.task_timeout = 12 * 60 * 60
 
+    only_if_stale = module.foreman_params['only_if_stale'] or 'max_age' in module.foreman_params
+
     with module.api_connection():
-        product = module.lookup_entity('product')
-        repository = module.lookup_entity('repository')
-        if repository:
-            task = module.resource_action('repositories', 'sync', {'id': repository['id']})
-        else:
-            task = module.resource_action('products', 'sync', {'id': product['id']})
-
-        module.exit_json(task=task)
+        if 'product' in module.foreman_params and not only_if_stale:
+            product = module.lookup_entity('product')
+            repository = module.lookup_entity('repository')
+            if repository:
+                task = module.resource_action('repositories', 'sync', {'id': repository['id']})
+            else:
+                task = module.resource_action('products', 'sync', {'id': product['id']})
+
+            module.exit_json(task=task)
+
+        products = module.foreman_params.get('products', [])
+        repositories = module.foreman_params.get('repositories', [])
+        if 'repository' in module.foreman_params:
+            repositories = [{'name': module.foreman_params['repository'], 'product': module.foreman_params['product']}]
+        elif 'product' in module.foreman_params:
+            products = [module.foreman_params['product']]
+
+        to_sync = find_sync_repositories(module, products, repositories)
+        skipped = []
+        if only_if_stale:
+            skipped = [repository for repository in to_sync if not is_stale(repository, module.foreman_params.get('max_age'))]
+            to_sync = [repository for repository in to_sync if repository not in skipped]
+
+        outcomes = sync_repositories(module, to_sync, skipped)
+        failed = [outcome for outcome in outcomes if outcome['result'] not in (None, 'success')]
+        if failed:
+            module.fail_json(msg="Failed to sync repositories: {0}".format(
+                ', '.join('{0} ({1})'.format(outcome['name'], outcome['product']) for outcome in failed)), repositories=outcomes)
+        module.exit_json(repositories=outcomes)
 
 
 if __name__ == '__main__':
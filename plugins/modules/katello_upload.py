@@ -38,6 +38,9 @@ options:
   src:
     description:
       - File to upload
+      - Can also be a directory or a glob pattern, to upload all files in the directory or all files matching the pattern
+      - An existing file is uploaded as is, even if its name contains glob characters like C([)
+      - All files that do not exist in the repository yet are imported together in one step
     required: true
     type: path
     aliases:
@@ -52,6 +55,38 @@ options:
       - Product to which the repository lives in
     required: true
     type: str
+  chunk_size:
+    description:
+      - Size of the chunks the file is uploaded in, in bytes
+    default: 2097152
+    type: int
+  concurrency:
+    description:
+      - Number of chunks that are uploaded at the same time
+      - When uploading several files, the number of files that are uploaded at the same time
+    default: 1
+    type: int
+  chunk_retries:
+    description:
+      - Number of times the upload of a chunk is retried before giving up
+    default: 3
+    type: int
+  resume:
+    description:
+      - Keep track of the progress of the upload in a local state file, so an upload that failed halfway is continued by the next run
+      - The state file is stored below C(~/.cache/foreman-ansible-modules/uploads) and removed once the content has been imported
+      - An upload is only continued if the size, the modification time and the checksum of I(src) and the I(chunk_size) did not change
+      - The upload is only started again from the beginning when the server does not know it anymore, other errors keep the progress for the next run
+    default: true
+    type: bool
+  metadata_cache:
+    description:
+      - Cache the checksum and the package metadata of the uploaded files
+      - The cache is stored below C(~/.cache/foreman-ansible-modules/upload_metadata) and an entry is only used
+        as long as the size, the modification time and the inode of the file did not change
+      - Saves reading big files completely on every run just to find out they exist in the repository already
+    default: false
+    type: bool
 notes:
   - Currently only uploading to deb, RPM & file repositories is supported
   - For anything but file repositories, a supporting library must be installed. See Requirements.
@@ -70,15 +105,44 @@ EXAMPLES = '''
     repository: "Build RPMs"
     product: "My Product"
     organization: "Default Organization"
+
+- name: "Upload a big ISO, four chunks of 8MB at a time"
+  katello_upload:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    src: "rhel.iso"
+    repository: "ISOs"
+    product: "My Product"
+    organization: "Default Organization"
+    chunk_size: 8388608
+    concurrency: 4
+
+- name: "Upload all RPMs of a build, four at a time"
+  katello_upload:
+    username: "admin"
+    password: "changeme"
+    server_url: "https://foreman.example.com"
+    src: "build/RPMS/*/*.rpm"
+    repository: "Build RPMs"
+    product: "My Product"
+    organization: "Default Organization"
+    concurrency: 4
 '''
 
 RETURN = ''' # '''
 
+import glob
+import hashlib
+import json
+import mmap
 import os
+import tempfile
 import traceback
+import uuid
 
-from ansible.module_utils._text import to_bytes
-from ansible.module_utils.foreman_helper import KatelloAnsibleModule
+from ansible.module_utils._text import to_bytes, to_native
+from ansible.module_utils.foreman_helper import KatelloAnsibleModule, cache_dir
 
 try:
     from debian import debfile
@@ -96,6 +160,12 @@ except ImportError:
 
 CONTENT_CHUNK_SIZE = 2 * 1024 * 1024
 
+CONTENT_RESOURCES = {
+    'deb': 'debs',
+    'file': 'file_units',
+    'yum': 'packages',
+}
+
 
 def get_deb_info(path):
     control = debfile.DebFile(path).debcontrol()
@@ -125,69 +195,290 @@ def get_rpm_info(path):
     return (name, epoch, version, release, arch)
 
 
+class MultipartChunk(object):
+    """
+    multipart/form-data request body for one chunk of an upload.
+
+    The body is handed to requests as a stream, so the chunk is sent from the memory
+    it already lives in, without being copied into an encoded request body first.
+    """
+
+    def __init__(self, fields, content):
+        boundary = uuid.uuid4().hex
+        head = b''
+        for name, value in fields:
+            head += to_bytes('--{0}\r\nContent-Disposition: form-data; name="{1}"\r\n\r\n{2}\r\n'.format(boundary, name, value))
+        head += to_bytes('--{0}\r\nContent-Disposition: form-data; name="content"\r\n\r\n'.format(boundary))
+        tail = to_bytes('\r\n--{0}--\r\n'.format(boundary))
+        self.content_type = 'multipart/form-data; boundary={0}'.format(boundary)
+        self._names = [name for name, _value in fields] + ['content']
+        self._parts = [memoryview(head), memoryview(content), memoryview(tail)]
+        self._length = sum(len(part) for part in self._parts)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return iter(self._parts)
+
+    def keys(self):
+        # apypie validates the parameters passed as data by their names
+        return self._names
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = b''.join(part.tobytes() for part in self._parts)
+            self._parts = []
+            return data
+        while self._parts:
+            part = self._parts.pop(0)
+            if len(part) > size:
+                self._parts.insert(0, part[size:])
+                return part[:size]
+            if len(part):
+                return part
+        return b''
+
+
+def chunk_view(contentmap, offset, size):
+    try:
+        return memoryview(contentmap)[offset:offset + size]
+    except TypeError:
+        # Python 2 mmap objects do not support the buffer protocol of memoryview
+        return contentmap[offset:offset + size]
+
+
+def chunk_body(contentmap, offset, size):
+    chunk = chunk_view(contentmap, offset, size)
+    return MultipartChunk([('offset', offset), ('size', len(chunk))], chunk)
+
+
+def upload_chunk(module, content_upload_scope, contentmap, offset, size):
+    data = chunk_body(contentmap, offset, size)
+    module.resource_action('content_uploads', 'update', params=content_upload_scope, data=data,
+                           headers={'Content-Type': data.content_type})
+    return offset
+
+
+def resume_chunk(module, content_upload_scope, contentmap, offset, size):
+    """Upload the first pending chunk of a resumed upload, return False if the server does not know the upload anymore"""
+    data = chunk_body(contentmap, offset, size)
+    payload = module._resource_prepare_params('content_uploads', 'update', content_upload_scope)
+    try:
+        module._resource_call('content_uploads', 'update', payload, data=data, headers={'Content-Type': data.content_type})
+    except Exception as e:
+        response = getattr(e, 'response', None)
+        if response is not None and response.status_code == 404:
+            # the server cleaned up the upload in the meantime
+            return False
+        # keep the state, so the next run resumes the upload again
+        module.fail_from_exception(e, 'Error while resuming upload {0}: {1}'.format(content_upload_scope['id'], to_native(e)))
+    module.set_changed()
+    return True
+
+
+def load_json_file(file_name):
+    try:
+        with open(file_name) as json_file:
+            return json.load(json_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def save_json_file(file_name, data):
+    fd, tmp_file_name = tempfile.mkstemp(dir=os.path.dirname(file_name))
+    with os.fdopen(fd, 'w') as json_file:
+        json.dump(data, json_file)
+    os.rename(tmp_file_name, file_name)
+
+
+def remove_upload_state(state_file):
+    try:
+        os.unlink(state_file)
+    except OSError:
+        pass
+
+
+def expand_src(src):
+    if os.path.isfile(src):
+        # an existing file is taken literally, even if its name looks like a pattern, e.g. foo[1].rpm
+        return [src]
+    elif os.path.isdir(src):
+        paths = [os.path.join(src, name) for name in sorted(os.listdir(src))]
+    elif any(char in src for char in '*?['):
+        paths = sorted(glob.glob(src))
+    else:
+        return [src]
+    return [path for path in paths if os.path.isfile(path)]
+
+
+def get_content_unit_info(content_type, b_path, filename, checksum):
+    """Return the fields identifying the content unit of a file in a repository, as a list of (name, value) pairs"""
+    if content_type == 'deb':
+        name, version, architecture = get_deb_info(b_path)
+        return [('name', name), ('version', version), ('architecture', architecture)]
+    elif content_type == 'yum':
+        name, epoch, version, release, arch = get_rpm_info(b_path)
+        return [('name', name), ('epoch', epoch), ('version', version), ('release', release), ('arch', arch)]
+    return [('name', filename), ('checksum', checksum)]
+
+
+def get_file_metadata(module, path, content_type, use_cache=False):
+    """Return the checksum and the content unit fields of a file, from the metadata cache if the file did not change"""
+    stat = os.stat(path)
+    file_stat = [stat.st_size, stat.st_mtime, stat.st_ino]
+    cache_file_name = None
+    if use_cache:
+        key = json.dumps([os.path.abspath(path), content_type])
+        cache_file_name = os.path.join(cache_dir('upload_metadata'), hashlib.sha256(to_bytes(key)).hexdigest() + '.json')
+        metadata = load_json_file(cache_file_name)
+        if metadata is not None and metadata.get('stat') == file_stat:
+            return metadata
+
+    checksum = module.sha256(path)
+    content_unit_info = get_content_unit_info(content_type, to_bytes(path), os.path.basename(path), checksum)
+    metadata = {'stat': file_stat, 'checksum': checksum, 'content_unit': content_unit_info}
+    if cache_file_name:
+        save_json_file(cache_file_name, metadata)
+    return metadata
+
+
+def content_unit_key(fields, content_unit):
+    return tuple(str(content_unit[name]) for name in fields)
+
+
+def find_existing_content_units(module, resource, content_unit_infos, repository_scope):
+    """Return the keys of all given content units that exist in the repository"""
+    fields = [name for name, _value in content_unit_infos[0]]
+    searches = [' and '.join('{0} = "{1}"'.format(name, value) for name, value in info) for info in content_unit_infos]
+    return set(content_unit_key(fields, content_unit) for content_unit in module.list_resource_by_searches(resource, searches, repository_scope))
+
+
+def upload_file(module, repository_scope, b_src, checksum, state_file=None, concurrency=1):
+    stat = os.stat(b_src)
+    chunk_size = module.foreman_params['chunk_size']
+    chunk_offsets = list(range(0, stat.st_size, chunk_size))
+    contentmap = None
+    if chunk_offsets:
+        # all chunks are read from one read-only mapping of the file
+        with open(b_src, 'rb') as contentfile:
+            contentmap = mmap.mmap(contentfile.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime, 'checksum': checksum, 'chunk_size': chunk_size}
+        upload_state = None
+        if state_file:
+            upload_state = load_json_file(state_file)
+            if upload_state is not None and upload_state.get('fingerprint') != fingerprint:
+                upload_state = None
+
+        if upload_state is not None:
+            content_upload_scope = {'id': upload_state['upload_id']}
+            content_upload_scope.update(repository_scope)
+            pending_offsets = [offset for offset in chunk_offsets if offset >= upload_state['offset']]
+            if pending_offsets:
+                if resume_chunk(module, content_upload_scope, contentmap, pending_offsets[0], chunk_size):
+                    upload_state['offset'] = pending_offsets.pop(0) + chunk_size
+                    save_json_file(state_file, upload_state)
+                else:
+                    upload_state = None
+            chunk_offsets = pending_offsets
+
+        if upload_state is None:
+            content_upload_payload = {'size': stat.st_size}
+            content_upload_payload.update(repository_scope)
+            content_upload = module.resource_action('content_uploads', 'create', content_upload_payload)
+            content_upload_scope = {'id': content_upload['upload_id']}
+            content_upload_scope.update(repository_scope)
+            upload_state = {'upload_id': content_upload['upload_id'], 'fingerprint': fingerprint, 'offset': 0}
+            chunk_offsets = list(range(0, stat.st_size, chunk_size))
+            if state_file:
+                save_json_file(state_file, upload_state)
+
+        # the results arrive in the order of the offsets, so every result acknowledges all chunks up to it
+        for offset in module.concurrent_map(
+                lambda offset: upload_chunk(module, content_upload_scope, contentmap, offset, chunk_size),
+                chunk_offsets, concurrency, retries=module.foreman_params['chunk_retries']):
+            upload_state['offset'] = offset + chunk_size
+            if state_file:
+                save_json_file(state_file, upload_state)
+
+        return content_upload_scope
+    finally:
+        if contentmap is not None:
+            try:
+                contentmap.close()
+            except BufferError:
+                # the chunk of a failed request still uses the mapping, it is unmapped once that chunk is garbage collected
+                pass
+
+
 def main():
     module = KatelloAnsibleModule(
         foreman_spec=dict(
             src=dict(required=True, type='path', aliases=['file']),
             repository=dict(required=True, type='entity', scope=['product'], thin=False),
             product=dict(required=True, type='entity', scope=['organization']),
+            chunk_size=dict(type='int', default=CONTENT_CHUNK_SIZE),
+            concurrency=dict(type='int', default=1),
+            chunk_retries=dict(type='int', default=3),
+            resume=dict(type='bool', default=True),
+            metadata_cache=dict(type='bool', default=False),
         ),
     )
 
     with module.api_connection():
         repository_scope = module.scope_for('repository')
+        content_type = module.foreman_params['repository']['content_type']
 
-        b_src = to_bytes(module.foreman_params['src'])
-        filename = os.path.basename(module.foreman_params['src'])
-
-        checksum = module.sha256(module.foreman_params['src'])
-
-        content_unit = None
-        if module.foreman_params['repository']['content_type'] == 'deb':
-            if not HAS_DEBFILE:
-                module.fail_json(msg='The python-debian module is required', exception=DEBFILE_IMP_ERR)
-
-            name, version, architecture = get_deb_info(b_src)
-            query = 'name = "{0}" and version = "{1}" and architecture = "{2}"'.format(name, version, architecture)
-            content_unit = module.find_resource('debs', query, params=repository_scope, failsafe=True)
-        elif module.foreman_params['repository']['content_type'] == 'yum':
-            if not HAS_RPM:
-                module.fail_json(msg='The rpm Python module is required', exception=RPM_IMP_ERR)
-
-            name, epoch, version, release, arch = get_rpm_info(b_src)
-            query = 'name = "{0}" and epoch = "{1}" and version = "{2}" and release = "{3}" and arch = "{4}"'.format(name, epoch, version, release, arch)
-            content_unit = module.find_resource('packages', query, params=repository_scope, failsafe=True)
-        elif module.foreman_params['repository']['content_type'] == 'file':
-            query = 'name = "{0}" and checksum = "{1}"'.format(filename, checksum)
-            content_unit = module.find_resource('file_units', query, params=repository_scope, failsafe=True)
-        else:
+        if content_type not in CONTENT_RESOURCES:
             # possible types in 3.12: docker, ostree, yum, puppet, file, deb
-            module.fail_json(msg="Uploading to a {0} repository is not supported yet.".format(module.foreman_params['repository']['content_type']))
-
-        if not content_unit:
+            module.fail_json(msg="Uploading to a {0} repository is not supported yet.".format(content_type))
+        elif content_type == 'deb' and not HAS_DEBFILE:
+            module.fail_json(msg='The python-debian module is required', exception=DEBFILE_IMP_ERR)
+        elif content_type == 'yum' and not HAS_RPM:
+            module.fail_json(msg='The rpm Python module is required', exception=RPM_IMP_ERR)
+
+        paths = expand_src(module.foreman_params['src'])
+        if not paths:
+            module.fail_json(msg="No files found to upload in {0}".format(module.foreman_params['src']))
+
+        files = []
+        for path in paths:
+            metadata = get_file_metadata(module, path, content_type, module.foreman_params['metadata_cache'])
+            files.append({'path': path, 'b_path': to_bytes(path), 'name': os.path.basename(path),
+                          'checksum': metadata['checksum'], 'content_unit': metadata['content_unit']})
+
+        existing = find_existing_content_units(module, CONTENT_RESOURCES[content_type], [upload['content_unit'] for upload in files], repository_scope)
+        missing = [upload for upload in files if tuple(str(value) for _name, value in upload['content_unit']) not in existing]
+
+        if missing:
             if not module.check_mode:
-                size = os.stat(module.foreman_params['src']).st_size
-                content_upload_payload = {'size': size}
-                content_upload_payload.update(repository_scope)
-                content_upload = module.resource_action('content_uploads', 'create', content_upload_payload)
-                content_upload_scope = {'id': content_upload['upload_id']}
-                content_upload_scope.update(repository_scope)
-
-                offset = 0
-
-                with open(b_src, 'rb') as contentfile:
-                    for chunk in iter(lambda: contentfile.read(CONTENT_CHUNK_SIZE), b""):
-                        data = {'content': chunk, 'offset': offset, 'size': len(chunk)}
-                        module.resource_action('content_uploads', 'update', params=content_upload_scope, data=data)
-
-                        offset += len(chunk)
-
-                uploads = [{'id': content_upload['upload_id'], 'name': filename,
-                            'size': offset, 'checksum': checksum}]
+                for upload in missing:
+                    upload['state_file'] = None
+                    if module.foreman_params['resume']:
+                        upload['state_file'] = module.cache_file('uploads', [module.foreman_params['repository']['id'], os.path.abspath(upload['path'])])
+
+                if len(missing) == 1:
+                    # a single file uploads its chunks concurrently
+                    upload = missing[0]
+                    content_upload_scopes = [upload_file(module, repository_scope, upload['b_path'], upload['checksum'], upload['state_file'],
+                                                         module.foreman_params['concurrency'])]
+                else:
+                    content_upload_scopes = list(module.concurrent_map(
+                        lambda upload: upload_file(module, repository_scope, upload['b_path'], upload['checksum'], upload['state_file']),
+                        missing, module.foreman_params['concurrency']))
+
+                uploads = [{'id': content_upload_scope['id'], 'name': upload['name'],
+                            'size': os.stat(upload['path']).st_size, 'checksum': upload['checksum']}
+                           for upload, content_upload_scope in zip(missing, content_upload_scopes)]
                 import_params = {'id': module.foreman_params['repository']['id'], 'uploads': uploads}
                 module.resource_action('repositories', 'import_uploads', import_params)
+                for upload in missing:
+                    if upload['state_file']:
+                        remove_upload_state(upload['state_file'])
 
-                module.resource_action('content_uploads', 'destroy', content_upload_scope)
+                for content_upload_scope in content_upload_scopes:
+                    module.resource_action('content_uploads', 'destroy', content_upload_scope)
             else:
                 module.set_changed()
 
@@ -66,6 +66,34 @@ options:
       - present
       - absent
     type: str
+  pools:
+    description:
+      - Subscription pools to attach or remove in one run, instead of a single I(pool_id)
+    type: list
+    elements: dict
+    suboptions:
+      pool_id:
+        description:
+          - Subscription pool_id
+        required: true
+        type: str
+      quantity:
+        description:
+          - quantity of pool_id Subscriptions
+        type: int
+      pool_state:
+        description:
+          - Subscription state
+        default: present
+        choices:
+          - present
+          - absent
+        type: str
+  concurrency:
+    description:
+      - Number of subscriptions removed or attached at the same time
+    default: 4
+    type: int
   state:
     description:
       - Manifest state
@@ -77,6 +105,8 @@ options:
   path:
     description:
       - path to export the manifest
+      - The manifest is only downloaded when the file at I(path) is not an export of the manifest taken after its last change.
+      - The download is verified and moved to I(path) once it is complete.
     type: path
   validate_certs:
     description:
@@ -108,6 +138,19 @@ EXAMPLES = '''
     quantity: 10
     path: /root/manifest.zip
 
+- name: Ensure the subs of two pools in one go and remove a third one
+  redhat_manifest:
+    name: katello.example.com
+    username: john-smith
+    password: changeme
+    pools:
+      - pool_id: XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+        quantity: 10
+      - pool_id: YYYYYYYYYYYYYYYYYYYYYYYYYYYYYYYY
+        quantity: 2
+      - pool_id: ZZZZZZZZZZZZZZZZZZZZZZZZZZZZZZZZ
+        pool_state: absent
+
 - name: Remove all of one subs from katello.example.com
   redhat_manifest:
     name: katello.example.com
@@ -119,42 +162,104 @@ EXAMPLES = '''
 
 RETURN = '''# '''
 
+import base64
+import hashlib
 import json
 import os
+from multiprocessing.pool import ThreadPool
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.urls import fetch_url
 from ansible.module_utils._text import to_text, to_native
+from ansible.module_utils.foreman_helper import manifest_identity, parse_timestamp
+
+try:
+    import requests
+    HAS_REQUESTS = True
+except ImportError:
+    HAS_REQUESTS = False
 
 
 REDHAT_UEP = '/etc/rhsm/ca/redhat-uep.pem'
+CHUNK_SIZE = 65536  # 64K
 
 
-def fetch_portal(module, path, method, data=None, accept_header='application/json'):
+class PortalResponse(object):
+    """Read a response of the portal session like the ones returned by fetch_url, in chunks of up to CHUNK_SIZE"""
+
+    def __init__(self, response):
+        self.response = response
+        self.chunks = response.iter_content(CHUNK_SIZE)
+
+    def read(self, size=None):
+        if size is None:
+            return b''.join(self.chunks)
+        return next(self.chunks, b'')
+
+
+def portal_session(module):
+    if getattr(module, 'portal_session', None) is None:
+        session = requests.Session()
+        session.auth = (module.params['username'], module.params['password'])
+        if module.params['validate_certs']:
+            session.verify = REDHAT_UEP if os.path.exists(REDHAT_UEP) else True
+        else:
+            session.verify = False
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(module.params['concurrency'], 1))
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        module.portal_session = session
+    return module.portal_session
+
+
+def portal_request(module, path, method, data=None, accept_header='application/json', stream=False):
+    """Send a request to the portal and return the response, its info and an error message if it failed"""
     if data is None:
         data = {}
     url = module.params['portal'] + path
     headers = {'accept': accept_header,
                'content-type': 'application/json'}
-    fetch_kwargs = {'timeout': 30}
-    if os.path.exists(REDHAT_UEP):
-        fetch_kwargs['ca_path'] = REDHAT_UEP
-    try:
-        resp, info = fetch_url(module, url, json.dumps(data), headers, method, **fetch_kwargs)
-    except TypeError:
-        # ca_path was added in Ansible 2.9 and backported to 2.8 in 2.8.6
-        # older Ansible releases don't support that and we have to omit the CA cert here
-        if module.params['validate_certs']:
-            module.warn("Your Ansible version does not support providing custom CA certificates for HTTP requests. "
-                        "Talking to the Red Hat portal might fail without validate_certs=False. Please update.")
-        del fetch_kwargs['ca_path']
-        resp, info = fetch_url(module, url, json.dumps(data), headers, method, **fetch_kwargs)
+    if HAS_REQUESTS:
+        # all requests of a run go through one keep-alive connection pool
+        try:
+            response = portal_session(module).request(method, url, data=json.dumps(data), headers=headers, timeout=30, stream=stream)
+        except requests.exceptions.RequestException as e:
+            return None, {'status': -1, 'msg': to_native(e)}, "%s to %s failed, got %s" % (method, url, to_native(e))
+        # fetch_url returns the response headers lower cased in the info
+        info = dict((key.lower(), value) for key, value in response.headers.items())
+        info.update(status=response.status_code, msg=response.reason)
+        if response.status_code >= 400:
+            resp = None
+            info['body'] = response.text
+        else:
+            resp = PortalResponse(response)
+    else:
+        fetch_kwargs = {'timeout': 30}
+        if os.path.exists(REDHAT_UEP):
+            fetch_kwargs['ca_path'] = REDHAT_UEP
+        try:
+            resp, info = fetch_url(module, url, json.dumps(data), headers, method, **fetch_kwargs)
+        except TypeError:
+            # ca_path was added in Ansible 2.9 and backported to 2.8 in 2.8.6
+            # older Ansible releases don't support that and we have to omit the CA cert here
+            if module.params['validate_certs']:
+                module.warn("Your Ansible version does not support providing custom CA certificates for HTTP requests. "
+                            "Talking to the Red Hat portal might fail without validate_certs=False. Please update.")
+            del fetch_kwargs['ca_path']
+            resp, info = fetch_url(module, url, json.dumps(data), headers, method, **fetch_kwargs)
     if resp is None:
         try:
             error = json.loads(info['body'])['displayMessage']
         except Exception:
             error = info['msg']
-        module.fail_json(msg="%s to %s failed, got %s" % (method, url, error))
+        return resp, info, "%s to %s failed, got %s" % (method, url, error)
+    return resp, info, None
+
+
+def fetch_portal(module, path, method, data=None, accept_header='application/json', stream=False):
+    resp, info, error = portal_request(module, path, method, data, accept_header, stream)
+    if error:
+        module.fail_json(msg=error)
     return resp, info
 
 
@@ -209,66 +314,116 @@ def get_owner(module):
 def get_subs(module, manifest):
     path = "/subscription/consumers/%s/entitlements" % (manifest['uuid'])
     resp, info = fetch_portal(module, path, 'GET')
-    all_subs = json.loads(to_text(resp.read()))
-    subs = [s for s in all_subs if s['pool']['id'] == module.params['pool_id']]
-    return subs
-
-
-def get_remove_or_attach_sub(module, manifest):
-    changed = False
-    subs = get_subs(module, manifest)
-    if subs:
-        if module.params['pool_state'] == 'present':
-            sub_quantity = sum(s['quantity'] for s in subs)
-            while sub_quantity > module.params['quantity']:
-                if not module.check_mode:
-                    remove_sub(module, manifest, subs[0])
-                else:
-                    changed = True
-                    break
-                changed = True
-                subs = get_subs(module, manifest)
-                sub_quantity = sum(s['quantity'] for s in subs)
-            if sub_quantity < module.params['quantity']:
-                difference = module.params['quantity'] - sub_quantity
-                if not module.check_mode:
-                    attach_sub(module, manifest, difference)
-                changed = True
-        elif module.params['pool_state'] == 'absent':
-            if not module.check_mode:
-                for sub in subs:
-                    remove_sub(module, manifest, sub)
-            changed = True
-    elif module.params['pool_state'] == 'present':
-        if not module.check_mode:
-            attach_sub(module, manifest, module.params['quantity'])
-        changed = True
-    return changed
+    return json.loads(to_text(resp.read()))
+
+
+def surplus_subs(subs, quantity):
+    """Pick the entitlements to remove to get down to quantity, return them and the quantity that is left"""
+    surplus = sum(s['quantity'] for s in subs) - quantity
+    remove = []
+    for sub in sorted(subs, key=lambda s: s['quantity'], reverse=True):
+        if 0 < sub['quantity'] <= surplus:
+            remove.append(sub)
+            surplus -= sub['quantity']
+    if surplus > 0:
+        # the entitlements can't be split, so remove the smallest one left and attach the difference again
+        sub = min((s for s in subs if s not in remove), key=lambda s: s['quantity'])
+        remove.append(sub)
+        surplus -= sub['quantity']
+    return remove, quantity + surplus
+
+
+def get_remove_or_attach_subs(module, manifest, pools):
+    """Work out all entitlements to remove and all subscriptions to attach in one pass over the entitlements"""
+    all_subs = get_subs(module, manifest)
+    removals = []
+    attachments = []
+    for pool in pools:
+        subs = [s for s in all_subs if s['pool']['id'] == pool['pool_id']]
+        if pool['pool_state'] == 'absent':
+            removals.extend(subs)
+            continue
+        sub_quantity = sum(s['quantity'] for s in subs)
+        if sub_quantity > pool['quantity']:
+            remove, sub_quantity = surplus_subs(subs, pool['quantity'])
+            removals.extend(remove)
+        if sub_quantity < pool['quantity']:
+            attachments.append((pool['pool_id'], pool['quantity'] - sub_quantity))
+    return removals, attachments
 
 
 def remove_sub(module, manifest, sub):
     path = "/subscription/consumers/%s/entitlements/%s" % (manifest['uuid'], sub['id'])
-    fetch_portal(module, path, 'DELETE')
+    return portal_request(module, path, 'DELETE')[2]
 
 
-def attach_sub(module, manifest, quantity):
-    path = "/subscription/consumers/%s/entitlements?pool=%s&quantity=%s" % (manifest['uuid'], module.params['pool_id'], quantity)
-    fetch_portal(module, path, 'POST')
+def attach_sub(module, manifest, pool_id, quantity):
+    path = "/subscription/consumers/%s/entitlements?pool=%s&quantity=%s" % (manifest['uuid'], pool_id, quantity)
+    return portal_request(module, path, 'POST')[2]
+
+
+def change_subs(module, manifest, removals, attachments):
+    # fetch_url can't share a connection between threads, so only the session sends requests concurrently
+    workers = module.params['concurrency'] if HAS_REQUESTS else 1
+    thread_pool = ThreadPool(max(workers, 1))
+    try:
+        # removals go first, they might free the entitlements the attachments need
+        errors = thread_pool.map(lambda sub: remove_sub(module, manifest, sub), removals)
+        if not any(errors):
+            errors = thread_pool.map(lambda attachment: attach_sub(module, manifest, *attachment), attachments)
+    finally:
+        thread_pool.close()
+    errors = [error for error in errors if error]
+    if errors:
+        module.fail_json(msg="Failed to change the subscriptions of the manifest: {0}".format(', '.join(errors)))
+
+
+def export_is_current(module, manifest):
+    """Check whether the file at path is an export of the manifest taken after its last change"""
+    identity = manifest_identity(module.params['path'])
+    if identity is None or not manifest.get('updated'):
+        return False
+    uuid, created = identity
+    return uuid == manifest['uuid'] and created >= parse_timestamp(manifest['updated'])
+
+
+def verify_export(manifest, part_path, info, received, checksum):
+    if 'content-length' in info and 'content-encoding' not in info and int(info['content-length']) != received:
+        return "got %s bytes, expected %s" % (received, info['content-length'])
+    for digest in info.get('digest', '').split(','):
+        algorithm, _sep, value = digest.strip().partition('=')
+        if algorithm.lower() == 'sha-256' and base64.b64decode(value) != checksum.digest():
+            return "the SHA-256 checksum does not match"
+    identity = manifest_identity(part_path)
+    if identity is None or identity[0] != manifest['uuid']:
+        return "the download is not an export of manifest %s" % manifest['uuid']
+    return None
 
 
 def export_manifest(module, manifest):
+    """Download the manifest next to path and move it in place once it is verified"""
     path = "/subscription/consumers/%s/export" % (manifest['uuid'])
+    part_path = module.params['path'] + '.part'
     try:
-        resp, info = fetch_portal(module, path, 'GET', accept_header='application/zip')
-        if not module.check_mode:
-            with open(module.params['path'], 'wb') as f:
-                while True:
-                    data = resp.read(65536)  # 64K
-                    if not data:
-                        break
-                    f.write(data)
-    except Exception as e:
-        module.fail_json(msg="Failure downloading manifest, {0}".format(to_native(e)))
+        try:
+            resp, info = fetch_portal(module, path, 'GET', accept_header='application/zip', stream=True)
+            checksum = hashlib.sha256()
+            received = 0
+            with open(part_path, 'wb') as part_file:
+                for data in iter(lambda: resp.read(CHUNK_SIZE), b''):
+                    part_file.write(data)
+                    checksum.update(data)
+                    received += len(data)
+        except Exception as e:
+            module.fail_json(msg="Failure downloading manifest, {0}".format(to_native(e)))
+        error = verify_export(manifest, part_path, info, received, checksum)
+        if error:
+            module.fail_json(msg="Failure downloading manifest, {0}".format(error))
+        module.atomic_move(part_path, module.params['path'])
+    finally:
+        # also when fail_json exits, an incomplete download must not be left behind
+        if os.path.exists(part_path):
+            os.remove(part_path)
 
 
 def main():
@@ -281,15 +436,32 @@ def main():
             pool_id=dict(type='str'),
             quantity=dict(type='int'),
             pool_state=dict(choices=['present', 'absent'], default='present'),
+            pools=dict(type='list', elements='dict', options=dict(
+                pool_id=dict(type='str', required=True),
+                quantity=dict(type='int'),
+                pool_state=dict(choices=['present', 'absent'], default='present'),
+            )),
+            concurrency=dict(type='int', default=4),
             state=dict(choices=['present', 'absent'], default='present'),
             path=dict(type='path'),
             validate_certs=dict(default=True, type='bool'),
             portal=dict(default='https://subscription.rhsm.redhat.com'),
         ),
         required_one_of=[['name', 'uuid']],
+        mutually_exclusive=[['pool_id', 'pools']],
         supports_check_mode=True,
     )
 
+    if module.params['pools'] is not None:
+        pools = module.params['pools']
+    elif module.params['pool_id']:
+        pools = [{'pool_id': module.params['pool_id'], 'quantity': module.params['quantity'], 'pool_state': module.params['pool_state']}]
+    else:
+        pools = []
+    missing_quantity = [pool['pool_id'] for pool in pools if pool['pool_state'] == 'present' and pool['quantity'] is None]
+    if missing_quantity:
+        module.fail_json(msg="A quantity is required to attach the pools {0}".format(', '.join(missing_quantity)))
+
     if module.params['validate_certs'] and not os.path.exists(REDHAT_UEP):
         module.warn("Couldn't find the Red Hat Entitlement Platform CA certificate ({0}) on your system. "
                     "It's required to validate the certificate of {1}.".format(REDHAT_UEP, module.params['portal']))
@@ -305,15 +477,23 @@ def main():
     module.params['rhsm_owner'] = get_owner(module)
 
     manifest, man_changed = get_manifest(module)
-    if module.params['pool_id'] and manifest:
-        sub_changed = get_remove_or_attach_sub(module, manifest)
+    if pools and manifest:
+        removals, attachments = get_remove_or_attach_subs(module, manifest, pools)
+        sub_changed = bool(removals or attachments)
+        if sub_changed and not module.check_mode:
+            change_subs(module, manifest, removals, attachments)
     else:
         sub_changed = False
 
+    export_changed = False
     if module.params['path'] and manifest:
-        export_manifest(module, manifest)
+        # changing the manifest or its subscriptions updates it after it was fetched
+        if man_changed or sub_changed or not export_is_current(module, manifest):
+            if not module.check_mode:
+                export_manifest(module, manifest)
+            export_changed = True
 
-    changed = man_changed or sub_changed
+    changed = man_changed or sub_changed or export_changed
     module.exit_json(changed=changed)
 
 
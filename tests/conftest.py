@@ -3,6 +3,7 @@ import pytest
 
 TEST_PLAYBOOKS = [
     'activation_key',
+    'activation_key_subscriptions',
     'architecture',
     'auth_source_ldap',
     'bookmark',
@@ -12,7 +13,13 @@ TEST_PLAYBOOKS = [
     'content_credential',
     'content_view',
     'content_view_filter',
+    'content_view_filter_rules',
+    'content_view_publish',
     'content_view_version',
+    'content_view_version_cleanup',
+    'content_view_version_export',
+    'content_view_version_if_changed',
+    'content_view_version_import',
     'domain',
     'environment',
     'external_usergroup',
@@ -27,10 +34,12 @@ TEST_PLAYBOOKS = [
     'katello_hostgroup',
     'luna_hostgroup',
     'host_collection',
+    'host_collection_hosts',
     'installation_medium',
     'job_template',
     'katello_manifest',
     'katello_sync',
+    'katello_sync_repositories',
     'lifecycle_environment',
     'location',
     'model',
@@ -42,20 +51,25 @@ TEST_PLAYBOOKS = [
     'ptable',
     'realm',
     'redhat_manifest',
+    'redhat_manifest_pools',
     'repository',
     'repository_set',
+    'repository_sets',
     'role',
     'scc_account',
     'scc_product',
     'scap_content',
     'scap_tailoring_file',
     'search_facts',
+    'search_facts_output',
     'setting',
     'smart_class_parameter',
     'snapshot',
     'subnet',
     'sync_plan',
+    'template_directory',
     'upload',
+    'upload_files',
     'user',
     'usergroup',
 ]
@@ -0,0 +1,87 @@
+import sys
+
+import pytest
+
+from plugins.module_utils import foreman_helper
+
+# modules import the helper the way Ansible ships it to the managed host
+sys.modules.setdefault('ansible.module_utils.foreman_helper', foreman_helper)
+
+from plugins.modules import katello_content_view_version  # noqa: E402
+
+
+PUBLISHED = '2020-03-31 12:00:00 UTC'
+BEFORE = '2020-03-31 11:00:00 UTC'
+AFTER = '2020-03-31 13:00:00 UTC'
+
+
+class FakeContentViewModule(object):
+    """Stands in for KatelloEntityAnsibleModule and serves the repositories of the content view"""
+
+    _foremanapi_server_url = 'https://foreman.example.com'
+    _foremanapi_username = 'admin'
+
+    cache_file = foreman_helper.ForemanAnsibleModule.cache_file
+    locked_cache_file = foreman_helper.ForemanAnsibleModule.locked_cache_file
+
+    def __init__(self):
+        self.repositories = [{'product': {'id': 1}, 'label': 'repo', 'last_sync': {'ended_at': BEFORE}}]
+
+    def list_resource(self, resource, search=None, params=None):
+        assert resource == 'repositories'
+        return self.repositories
+
+
+def content_view_filter(filter_id, rule_ids, updated_at=BEFORE):
+    return {'id': filter_id, 'updated_at': updated_at, 'rules': [{'id': rule_id, 'updated_at': updated_at} for rule_id in rule_ids]}
+
+
+@pytest.fixture
+def module(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', tmpdir.join('cache').strpath)
+    return FakeContentViewModule()
+
+
+def changed(module, content_view_filters):
+    content_view = {'id': 1, 'next_version': '3.0'}
+    latest_version = {'id': 10, 'version': '2.0', 'published': PUBLISHED}
+    return katello_content_view_version.content_view_changed(module, content_view, latest_version, content_view_filters, {'organization_id': 1})
+
+
+def record(module, content_view_filters):
+    katello_content_view_version.record_filters(module, {'id': 1, 'next_version': '2.0'}, content_view_filters)
+
+
+def test_unchanged(module):
+    filters = [content_view_filter(1, [1, 2]), content_view_filter(2, [])]
+    record(module, filters)
+    assert not changed(module, filters)
+    assert not changed(module, list(reversed(filters)))
+
+
+def test_not_recorded(module):
+    assert changed(module, [])
+
+
+@pytest.mark.parametrize('current_filters', [
+    [content_view_filter(1, [1])],
+    [content_view_filter(1, [1, 2])],
+    [content_view_filter(1, [1, 2]), content_view_filter(2, [3]), content_view_filter(3, [])],
+    [content_view_filter(1, [1, 4]), content_view_filter(2, [3])],
+    [content_view_filter(2, [3])],
+    [],
+], ids=['rule removed', 'filter removed', 'filter added', 'rule replaced', 'filter with rules removed', 'all filters removed'])
+def test_changed_filters(module, current_filters):
+    record(module, [content_view_filter(1, [1, 2]), content_view_filter(2, [3])])
+    assert changed(module, current_filters)
+
+
+def test_modified_rule(module):
+    record(module, [content_view_filter(1, [1])])
+    assert changed(module, [content_view_filter(1, [1], updated_at=AFTER)])
+
+
+def test_synced_repository(module):
+    record(module, [])
+    module.repositories[0]['last_sync']['ended_at'] = AFTER
+    assert changed(module, [])
@@ -0,0 +1,268 @@
+import os
+import re
+import sys
+
+import pytest
+import requests
+from vcr.request import Request
+
+from plugins.module_utils import foreman_helper
+
+# modules import the helper the way Ansible ships it to the managed host
+sys.modules.setdefault('ansible.module_utils.foreman_helper', foreman_helper)
+
+from plugins.modules import katello_upload  # noqa: E402
+from tests.vcr_python_wrapper import upload_body_matcher  # noqa: E402
+
+
+class FakeUploadModule(object):
+    """Stands in for KatelloAnsibleModule and records the content upload requests"""
+
+    def __init__(self, chunk_size=4, chunk_retries=0, failing_offset=None, resume_status=None):
+        self.foreman_params = {'chunk_size': chunk_size, 'chunk_retries': chunk_retries}
+        self.failing_offset = failing_offset
+        self.resume_status = resume_status
+        self.created = []
+        self.chunks = []
+        self.changed = False
+
+    def resource_action(self, resource, action, params, data=None, headers=None):
+        if action == 'create':
+            self.created.append(params)
+            return {'upload_id': 'upload-{0}'.format(len(self.created))}
+        fields = multipart_fields(data.read(), headers['Content-Type'])
+        if fields['offset'] == str(self.failing_offset).encode('ascii'):
+            raise ConnectionError('connection lost')
+        self.chunks.append((params['id'], fields))
+        return None
+
+    def _resource_prepare_params(self, resource, action, params):
+        return dict(params)
+
+    def _resource_call(self, resource, action, payload, data=None, headers=None):
+        if self.resume_status is not None:
+            response = requests.Response()
+            response.status_code = self.resume_status
+            raise requests.exceptions.HTTPError('{0} Error'.format(self.resume_status), response=response)
+        self.chunks.append((payload['id'], multipart_fields(data.read(), headers['Content-Type'])))
+
+    def set_changed(self):
+        self.changed = True
+
+    def fail_from_exception(self, exc, msg):
+        raise AssertionError(msg)
+
+    def concurrent_map(self, func, items, workers, retries=0):
+        for item in items:
+            yield func(item)
+
+
+def multipart_fields(body, content_type):
+    boundary = content_type.split('boundary=', 1)[1].encode('ascii')
+    fields = {}
+    for part in body.split(b'--' + boundary)[1:-1]:
+        head, _sep, value = part.partition(b'\r\n\r\n')
+        fields[re.search(b'name="([^"]*)"', head).group(1).decode('ascii')] = value[:-2]
+    return fields
+
+
+def chunk_offsets(module):
+    return [(upload_id, int(fields['offset'])) for upload_id, fields in module.chunks]
+
+
+@pytest.fixture
+def src(tmpdir):
+    path = tmpdir.join('content.txt')
+    path.write_binary(b'0123456789')
+    return path.strpath
+
+
+def test_upload_file_sends_every_chunk(src):
+    module = FakeUploadModule(chunk_size=4)
+    scope = katello_upload.upload_file(module, {'repository_id': 1}, src, 'checksum', concurrency=3)
+    assert scope == {'id': 'upload-1', 'repository_id': 1}
+    assert module.created == [{'size': 10, 'repository_id': 1}]
+    assert [fields for _upload_id, fields in module.chunks] == [
+        {'offset': b'0', 'size': b'4', 'content': b'0123'},
+        {'offset': b'4', 'size': b'4', 'content': b'4567'},
+        {'offset': b'8', 'size': b'2', 'content': b'89'},
+    ]
+
+
+def test_upload_file_empty(tmpdir):
+    path = tmpdir.join('empty.txt')
+    path.write_binary(b'')
+    module = FakeUploadModule()
+    katello_upload.upload_file(module, {'repository_id': 1}, path.strpath, 'checksum')
+    assert module.created == [{'size': 0, 'repository_id': 1}]
+    assert module.chunks == []
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 1000])
+def test_multipart_chunk_read_in_pieces(size):
+    data = katello_upload.MultipartChunk([('offset', 4), ('size', 6)], b'abcdef')
+    length = len(data)
+    pieces = []
+    for piece in iter(lambda: data.read(size), b''):
+        assert 0 < len(piece) <= size
+        pieces.append(bytes(piece))
+    body = b''.join(pieces)
+    assert len(body) == length
+    assert multipart_fields(body, data.content_type) == {'offset': b'4', 'size': b'6', 'content': b'abcdef'}
+    assert list(data.keys()) == ['offset', 'size', 'content']
+
+
+def test_multipart_chunk_from_mmap(src):
+    with open(src, 'rb') as contentfile:
+        contentmap = katello_upload.mmap.mmap(contentfile.fileno(), 0, access=katello_upload.mmap.ACCESS_READ)
+    data = katello_upload.MultipartChunk([('offset', 2)], katello_upload.chunk_view(contentmap, 2, 3))
+    assert multipart_fields(data.read(), data.content_type)['content'] == b'234'
+    contentmap.close()
+
+
+def test_upload_file_closes_the_mapping(src, monkeypatch):
+    mappings = []
+    original_mmap = katello_upload.mmap.mmap
+
+    def recording_mmap(*args, **kwargs):
+        mappings.append(original_mmap(*args, **kwargs))
+        return mappings[-1]
+
+    monkeypatch.setattr(katello_upload.mmap, 'mmap', recording_mmap)
+    katello_upload.upload_file(FakeUploadModule(), {'repository_id': 1}, src, 'checksum')
+    assert len(mappings) == 1
+    assert mappings[0].closed
+
+
+def test_upload_body_matcher_compares_fields():
+    chunk = katello_upload.MultipartChunk([('offset', 0), ('size', 3)], b'a b')
+    multipart = Request('PUT', 'https://foreman.example.org/katello/api/repositories/1/content_uploads/abc', chunk.read(),
+                        {'content-type': chunk.content_type})
+    form = Request('PUT', 'https://foreman.example.org/katello/api/repositories/1/content_uploads/abc', b'offset=0&size=3&content=a+b',
+                   {'content-type': 'application/x-www-form-urlencoded'})
+    upload_body_matcher(multipart, form)
+    other = Request('PUT', 'https://foreman.example.org/katello/api/repositories/1/content_uploads/abc', b'offset=3&size=3&content=a+b',
+                    {'content-type': 'application/x-www-form-urlencoded'})
+    with pytest.raises(AssertionError):
+        upload_body_matcher(multipart, other)
+
+
+@pytest.fixture
+def big_src(tmpdir):
+    path = tmpdir.join('big.txt')
+    path.write_binary(b'0123456789abcd')
+    return path.strpath
+
+
+def interrupted_upload(big_src, state_file):
+    module = FakeUploadModule(failing_offset=8)
+    with pytest.raises(ConnectionError):
+        katello_upload.upload_file(module, {'repository_id': 1}, big_src, 'checksum', state_file)
+    assert chunk_offsets(module) == [('upload-1', 0), ('upload-1', 4)]
+    assert katello_upload.load_json_file(state_file)['offset'] == 8
+
+
+def test_upload_file_resumes_an_interrupted_upload(big_src, tmpdir):
+    state_file = tmpdir.join('state.json').strpath
+    interrupted_upload(big_src, state_file)
+
+    module = FakeUploadModule()
+    scope = katello_upload.upload_file(module, {'repository_id': 1}, big_src, 'checksum', state_file)
+    assert scope == {'id': 'upload-1', 'repository_id': 1}
+    assert module.created == []
+    assert chunk_offsets(module) == [('upload-1', 8), ('upload-1', 12)]
+    assert katello_upload.load_json_file(state_file)['offset'] == 16
+
+
+def test_upload_file_restarts_an_upload_the_server_dropped(big_src, tmpdir):
+    state_file = tmpdir.join('state.json').strpath
+    interrupted_upload(big_src, state_file)
+
+    module = FakeUploadModule(resume_status=404)
+    scope = katello_upload.upload_file(module, {'repository_id': 1}, big_src, 'checksum', state_file)
+    assert scope == {'id': 'upload-1', 'repository_id': 1}
+    assert len(module.created) == 1
+    assert chunk_offsets(module) == [('upload-1', 0), ('upload-1', 4), ('upload-1', 8), ('upload-1', 12)]
+
+
+@pytest.mark.parametrize('status', [500, 502])
+def test_upload_file_keeps_the_state_on_other_errors(big_src, tmpdir, status):
+    state_file = tmpdir.join('state.json').strpath
+    interrupted_upload(big_src, state_file)
+    state = katello_upload.load_json_file(state_file)
+
+    module = FakeUploadModule(resume_status=status)
+    with pytest.raises(AssertionError, match='Error while resuming upload upload-1'):
+        katello_upload.upload_file(module, {'repository_id': 1}, big_src, 'checksum', state_file)
+    assert module.created == []
+    assert katello_upload.load_json_file(state_file) == state
+
+
+def test_upload_file_does_not_resume_a_changed_file(big_src, tmpdir):
+    state_file = tmpdir.join('state.json').strpath
+    interrupted_upload(big_src, state_file)
+
+    module = FakeUploadModule()
+    katello_upload.upload_file(module, {'repository_id': 1}, big_src, 'other checksum', state_file)
+    assert len(module.created) == 1
+    assert chunk_offsets(module)[0] == ('upload-1', 0)
+
+
+@pytest.fixture
+def src_dir(tmpdir):
+    for name in ['b.rpm', 'a.rpm', 'c.txt', 'foo[1].rpm', 'nested/d.rpm']:
+        tmpdir.join('files', name).write_binary(name.encode('ascii'), ensure=True)
+    return tmpdir.join('files').strpath
+
+
+def test_expand_src_directory(src_dir):
+    assert katello_upload.expand_src(src_dir) == [os.path.join(src_dir, name) for name in ['a.rpm', 'b.rpm', 'c.txt', 'foo[1].rpm']]
+
+
+def test_expand_src_pattern(src_dir):
+    pattern = os.path.join(src_dir, '*.rpm')
+    assert katello_upload.expand_src(pattern) == [os.path.join(src_dir, name) for name in ['a.rpm', 'b.rpm', 'foo[1].rpm']]
+    assert katello_upload.expand_src(os.path.join(src_dir, '*.deb')) == []
+
+
+def test_expand_src_file_with_glob_characters(src_dir):
+    path = os.path.join(src_dir, 'foo[1].rpm')
+    assert katello_upload.expand_src(path) == [path]
+
+
+def test_expand_src_missing_file(src_dir):
+    path = os.path.join(src_dir, 'missing.rpm')
+    assert katello_upload.expand_src(path) == [path]
+
+
+class ChecksumCountingModule(object):
+
+    def __init__(self):
+        self.checksummed = []
+
+    def sha256(self, path):
+        self.checksummed.append(path)
+        return 'checksum-{0}'.format(len(self.checksummed))
+
+
+def test_get_file_metadata_cache(src, tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', tmpdir.join('cache').strpath)
+    module = ChecksumCountingModule()
+
+    metadata = katello_upload.get_file_metadata(module, src, 'file', use_cache=True)
+    assert metadata['checksum'] == 'checksum-1'
+    assert [list(field) for field in metadata['content_unit']] == [['name', 'content.txt'], ['checksum', 'checksum-1']]
+    # cache hit
+    assert katello_upload.get_file_metadata(module, src, 'file', use_cache=True)['checksum'] == 'checksum-1'
+    assert len(module.checksummed) == 1
+    # without the cache, the file is always read
+    assert katello_upload.get_file_metadata(module, src, 'file')['checksum'] == 'checksum-2'
+
+    # cache miss, the file changed
+    with open(src, 'ab') as srcfile:
+        srcfile.write(b'more')
+    assert katello_upload.get_file_metadata(module, src, 'file', use_cache=True)['checksum'] == 'checksum-3'
+    assert katello_upload.get_file_metadata(module, src, 'file', use_cache=True)['checksum'] == 'checksum-3'
+    # cache miss, another content type
+    assert katello_upload.get_file_metadata(module, src, 'other', use_cache=True)['checksum'] == 'checksum-4'
+    assert len(module.checksummed) == 4
@@ -0,0 +1,69 @@
+import re
+import time
+
+import pytest
+
+from plugins.module_utils.foreman_helper import parse_template, template_metadata
+
+
+# the expression parse_template used before, only usable on small templates
+LEGACY_METADATA_RE = re.compile(r'<%#([^%]*([^%]*%*[^>%])*%*)%>')
+
+TEMPLATES = [
+    '',
+    'no metadata at all',
+    '<%#\nname: Test\n%>\nbody',
+    '<%#\nname: Test\n-%>\nbody',
+    'before <%# name: Test %> after <%# name: Other %>',
+    '<%= @host.name %>\n<%#\nname: Test\n%>',
+    '<%#\nname: 100%\nkind: snippet\n%%>',
+    '<%#\nsnippet: true\n% not the end\n%>',
+    '<%# never closed',
+    '<%#' + 'a' * 12,
+    '<% <%# a %> b %>',
+    '%>%> <%#%% %>',
+]
+
+
+class FailingModule(object):
+    def fail_json(self, **kwargs):
+        raise AssertionError(kwargs['msg'])
+
+
+def _legacy_metadata(template_content):
+    data = LEGACY_METADATA_RE.search(template_content)
+    return data.group(1) if data else None
+
+
+@pytest.mark.parametrize('template_content', TEMPLATES)
+def test_same_metadata_as_legacy_expression(template_content):
+    assert template_metadata(template_content) == _legacy_metadata(template_content)
+
+
+def test_parse_template():
+    template = parse_template('<%#\nname: Test\nkind: provision\n-%>\nbody', FailingModule())
+    assert template == {'name': 'Test', 'kind': 'provision', 'template': '<%#\nname: Test\nkind: provision\n-%>\nbody'}
+
+
+def test_parse_template_without_metadata():
+    assert parse_template('body', FailingModule()) == {'template': 'body'}
+
+
+# far above the milliseconds a linear scan needs, even on a slow or loaded machine,
+# yet far below the time a backtracking expression needs for these templates
+TIME_LIMIT = 5
+
+
+@pytest.mark.parametrize('template_content', [
+    # the legacy expression needs exponential time for an unclosed comment, already seconds for 25 characters
+    '<%#' + 'a' * 1024 * 1024,
+    '<%#' + '%a' * 512 * 1024,
+    '<%#' + '%' * 1024 * 1024,
+    # a 1 MB template with the metadata at the end and many erb tags before it
+    '<%= @host.name %>\n' * (1024 * 1024 // 18) + '<%#\nname: Test\n%>',
+], ids=['unclosed', 'unclosed_percent_signs', 'percent_signs', '1MB'])
+def test_large_templates_in_bounded_time(template_content):
+    assert len(template_content) >= 1024 * 1024
+    started = time.time()
+    template_metadata(template_content)
+    assert time.time() - started < TIME_LIMIT
@@ -1,13 +1,17 @@
 #!/usr/bin/env python
 
 import os
+import re
 import sys
+import threading
 import vcr
 import json
+import requests
 try:
     from urlparse import urlparse, urlunparse
+    from urllib import unquote as unquote_to_bytes
 except ImportError:
-    from urllib.parse import urlparse, urlunparse
+    from urllib.parse import urlparse, urlunparse, unquote_to_bytes
 
 
 # We need our own json level2 matcher, because, python2 and python3 do not save
@@ -81,6 +85,35 @@ def host_body_matcher(r1, r2):
     return body_json_l2_matcher(r1, r2)
 
 
+def _content_upload_fields(request):
+    content_type = request.headers.get('content-type', '')
+    body = request.body
+    if hasattr(body, 'read'):
+        body = body.read()
+    if content_type.startswith('multipart/form-data'):
+        boundary = content_type.split('boundary=', 1)[1].encode('ascii')
+        fields = {}
+        for part in body.split(b'--' + boundary)[1:-1]:
+            head, _sep, value = part.partition(b'\r\n\r\n')
+            fields[re.search(b'name="([^"]*)"', head).group(1)] = value[:-2]
+        return fields
+    fields = {}
+    for pair in body.split(b'&'):
+        name, _sep, value = pair.partition(b'=')
+        fields[name] = unquote_to_bytes(value.replace(b'+', b' '))
+    return fields
+
+
+def upload_body_matcher(r1, r2):
+    # chunks used to be sent form encoded and are now sent as multipart, so compare the submitted fields
+    if r1.method == r2.method == 'PUT' and '/content_uploads/' in r1.path and '/content_uploads/' in r2.path:
+        fields1 = _content_upload_fields(r1)
+        fields2 = _content_upload_fields(r2)
+        assert fields1 == fields2, "the submitted fields don't match"
+    else:
+        body_json_l2_matcher(r1, r2)
+
+
 def filter_apipie_checksum(response):
     # headers should be case insensitive, but for some reason they weren't for me
     response['headers'].pop('apipie-checksum', None)
@@ -88,63 +121,81 @@ def filter_apipie_checksum(response):
     return response
 
 
+def serialize_requests():
+    # vcrpy does not replay requests made by several threads at the same time reliably,
+    # so modules that talk to the server concurrently are replayed one request after the other
+    lock = threading.Lock()
+    original_request = requests.Session.request
+
+    def request(self, *args, **kwargs):
+        with lock:
+            return original_request(self, *args, **kwargs)
+
+    requests.Session.request = request
+
+
 def filter_request_uri(request):
     request.uri = urlunparse(urlparse(request.uri)._replace(netloc="foreman.example.org"))
     return request
 
 
-VCR_PARAMS_FILE = os.environ.get('FAM_TEST_VCR_PARAMS_FILE')
-
-# Remove the name of the wrapper from argv
-# (to make it look like the module had been called directly)
-sys.argv.pop(0)
-
-if VCR_PARAMS_FILE is None:
-    # Run the program as if nothing had happened
-    with open(sys.argv[0]) as f:
-        code = compile(f.read(), sys.argv[0], 'exec')
-        exec(code)
-else:
-    # Run the program wrapped within vcr cassette recorder
-    # Load recording parameters from file
-    with open(VCR_PARAMS_FILE, 'r') as params_file:
-        test_params = json.load(params_file)
-    cassette_file = 'fixtures/{}-{}.yml'.format(test_params['test_name'], test_params['serial'])
-    # Increase serial and dump back to file
-    test_params['serial'] += 1
-    with open(VCR_PARAMS_FILE, 'w') as params_file:
-        json.dump(test_params, params_file)
-
-    # Call the original python script with vcr-cassette in place
-    fam_vcr = vcr.VCR()
-
-    if test_params['test_name'] in ['domain', 'hostgroup', 'katello_hostgroup', 'luna_hostgroup', 'realm', 'subnet']:
-        fam_vcr.register_matcher('query_ignore_proxy', query_matcher_ignore_proxy)
-        query_matcher = 'query_ignore_proxy'
-    elif test_params['test_name'] == 'snapshot':
-        fam_vcr.register_matcher('snapshot_query', snapshot_query_matcher)
-        query_matcher = 'snapshot_query'
-    else:
-        query_matcher = 'query'
-
-    fam_vcr.register_matcher('body_json_l2', body_json_l2_matcher)
-
-    body_matcher = 'body_json_l2'
-    if test_params['test_name'] == 'host':
-        fam_vcr.register_matcher('host_body', host_body_matcher)
-        body_matcher = 'host_body'
-    elif test_params['test_name'] == 'katello_manifest':
-        fam_vcr.register_matcher('katello_manifest_body', katello_manifest_body_matcher)
-        body_matcher = 'katello_manifest_body'
-
-    with fam_vcr.use_cassette(cassette_file,
-                              record_mode=test_params['record_mode'],
-                              match_on=['method', 'path', query_matcher, body_matcher],
-                              filter_headers=['Authorization'],
-                              before_record_request=filter_request_uri,
-                              before_record_response=filter_apipie_checksum,
-                              decode_compressed_response=True,
-                              ):
+if __name__ == '__main__':
+    VCR_PARAMS_FILE = os.environ.get('FAM_TEST_VCR_PARAMS_FILE')
+
+    # Remove the name of the wrapper from argv
+    # (to make it look like the module had been called directly)
+    sys.argv.pop(0)
+
+    if VCR_PARAMS_FILE is None:
+        # Run the program as if nothing had happened
         with open(sys.argv[0]) as f:
             code = compile(f.read(), sys.argv[0], 'exec')
             exec(code)
+    else:
+        # Run the program wrapped within vcr cassette recorder
+        # Load recording parameters from file
+        with open(VCR_PARAMS_FILE, 'r') as params_file:
+            test_params = json.load(params_file)
+        cassette_file = 'fixtures/{}-{}.yml'.format(test_params['test_name'], test_params['serial'])
+        # Increase serial and dump back to file
+        test_params['serial'] += 1
+        with open(VCR_PARAMS_FILE, 'w') as params_file:
+            json.dump(test_params, params_file)
+
+        # Call the original python script with vcr-cassette in place
+        serialize_requests()
+        fam_vcr = vcr.VCR()
+
+        if test_params['test_name'] in ['domain', 'hostgroup', 'katello_hostgroup', 'luna_hostgroup', 'realm', 'subnet']:
+            fam_vcr.register_matcher('query_ignore_proxy', query_matcher_ignore_proxy)
+            query_matcher = 'query_ignore_proxy'
+        elif test_params['test_name'] == 'snapshot':
+            fam_vcr.register_matcher('snapshot_query', snapshot_query_matcher)
+            query_matcher = 'snapshot_query'
+        else:
+            query_matcher = 'query'
+
+        fam_vcr.register_matcher('body_json_l2', body_json_l2_matcher)
+
+        body_matcher = 'body_json_l2'
+        if test_params['test_name'] == 'host':
+            fam_vcr.register_matcher('host_body', host_body_matcher)
+            body_matcher = 'host_body'
+        elif test_params['test_name'] == 'katello_manifest':
+            fam_vcr.register_matcher('katello_manifest_body', katello_manifest_body_matcher)
+            body_matcher = 'katello_manifest_body'
+        elif test_params['test_name'] in ['upload', 'upload_files']:
+            fam_vcr.register_matcher('upload_body', upload_body_matcher)
+            body_matcher = 'upload_body'
+
+        with fam_vcr.use_cassette(cassette_file,
+                                  record_mode=test_params['record_mode'],
+                                  match_on=['method', 'path', query_matcher, body_matcher],
+                                  filter_headers=['Authorization'],
+                                  before_record_request=filter_request_uri,
+                                  before_record_response=filter_apipie_checksum,
+                                  decode_compressed_response=True,
+                                  ):
+            with open(sys.argv[0]) as f:
+                code = compile(f.read(), sys.argv[0], 'exec')
+                exec(code)